@@ -0,0 +1,81 @@
+"""
+时间解析微基准测试，比较parse_string_to_datetime的快速路径与dateutil
+用法：python benchmark/date_parsing.py [-n 1000000] [--baseline 20000]
+dateutil较慢，只测量baseline个时间，并按平均耗时估算n个时间的总耗时
+"""
+import os
+import sys
+import time
+import random
+import datetime
+import argparse
+
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from xyw_eyes.rss.dateparse import DateParser, format_rfc822
+
+
+def samples(kind: str, n: int) -> list:
+    """
+    生成n个指定格式的时间字符串
+    :param kind:
+    :param n:
+    :return:
+    """
+    random.seed(0)
+    start = datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+    result = []
+    for _ in range(n):
+        dt = datetime.datetime.fromtimestamp(start + random.randint(0, 10 ** 9), datetime.timezone.utc)
+        if kind == 'iso':
+            result.append(dt.isoformat())
+        elif kind == 'rfc822':
+            result.append(format_rfc822(dt))
+        elif kind == 'local':
+            result.append(dt.strftime('%Y-%m-%d %H:%M'))
+        elif kind == 'epoch':
+            result.append(str(int(dt.timestamp())))
+        elif kind == 'epoch_ms':
+            result.append(str(int(dt.timestamp() * 1000)))
+        elif kind == 'slash':
+            result.append(dt.strftime('%Y/%m/%d %H:%M:%S'))
+    return result
+
+
+def run(func, values) -> float:
+    begin = time.perf_counter()
+    for value in values:
+        func(value)
+    return time.perf_counter() - begin
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=1000000, help='每种格式解析的时间数量')
+    parser.add_argument('--baseline', type=int, default=20000, help='dateutil解析的时间数量')
+    args = parser.parse_args()
+
+    from dateutil.parser import parse
+
+    print('%-10s %12s %12s %12s %8s' % ('格式', '快速路径(s)', 'dateutil(s)', '单个(us)', '加速比'))
+    for kind in ('iso', 'rfc822', 'local', 'epoch', 'epoch_ms', 'slash'):
+        values = samples(kind, args.n)
+        date_parser = DateParser()
+        fast = run(lambda value: date_parser.parse(value, kind), values)
+        if kind.startswith('epoch'):
+            # dateutil无法解析时间戳，使用datetime.fromtimestamp作为对照
+            baseline = run(lambda value: datetime.datetime.fromtimestamp(
+                int(value) / (1000 if len(value) > 11 else 1), datetime.timezone.utc
+            ), values[:args.baseline])
+        else:
+            baseline = run(parse, values[:args.baseline])
+        baseline = baseline / min(args.baseline, args.n) * args.n
+        print('%-10s %12.2f %12.2f %12.2f %7.1fx' % (
+            kind, fast, baseline, fast / args.n * 1e6, baseline / fast
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+下载后端与事件循环基准测试，在同一个本地工作负载上比较各种组合每秒处理的request数
+用法：python benchmark/downloader.py [-n 2000] [--size 2048] [--concurrency 100] [--repeat 3]
+本地服务器运行在独立的进程中，没有安装uvloop时只测试asyncio事件循环
+"""
+import os
+import sys
+import time
+import socket
+import logging
+import argparse
+import tempfile
+import multiprocessing
+
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from xyw_eyes.spider import Spider
+from xyw_eyes.spider.backend import DOWNLOADERS
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(port: int, size: int) -> None:
+    """
+    本地服务器，每个页面返回size字节的html
+    """
+    from aiohttp import web
+    body = ('<html><body>%s</body></html>' % ('x' * max(size - 26, 0))).encode('utf-8')
+
+    async def page(request):
+        return web.Response(body=body, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/p/{n}', page)
+    web.run_app(app, host='127.0.0.1', port=port, print=None, access_log=None)
+
+
+def wait_port(port: int, timeout: float = 10) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('server did not start')
+
+
+def make_spider(port: int, n: int, concurrency: int, backend: str, loop: str) -> Spider:
+    class Bench(Spider):
+        name = 'benchmark'
+        start_urls = ['http://127.0.0.1:%d/p/%d' % (port, i) for i in range(n)]
+        downloader_backend = backend
+        event_loop = loop
+        adaptive_concurrency = False
+        max_concurrency = concurrency
+        prewarm_connections = 0
+
+        async def parse(self, response):
+            return None
+
+        async def item_pipeline(self, item):
+            pass
+
+    return Bench()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=2000, help='每次运行的request数量')
+    parser.add_argument('--size', type=int, default=2048, help='每个页面的字节数')
+    parser.add_argument('--concurrency', type=int, default=100, help='同时进行的下载数上限')
+    parser.add_argument('--repeat', type=int, default=3, help='每种组合运行的次数，取最快的一次')
+    args = parser.parse_args()
+
+    loops = ['asyncio']
+    try:
+        import uvloop
+        loops.append('uvloop')
+    except ImportError:
+        print('没有安装uvloop，只测试asyncio事件循环')
+
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(port, args.size), daemon=True)
+    server.start()
+    # 爬虫的日志文件写入临时目录，并且不输出日志，避免日志开销影响结果
+    os.chdir(tempfile.mkdtemp())
+    logging.disable(logging.CRITICAL)
+    try:
+        wait_port(port)
+        print('%-10s %-16s %10s %12s' % ('事件循环', '下载后端', '耗时(s)', 'request/s'))
+        for loop in loops:
+            for backend in DOWNLOADERS:
+                best = None
+                for _ in range(args.repeat):
+                    spider = make_spider(port, args.n, args.concurrency, backend, loop)
+                    begin = time.perf_counter()
+                    spider.run()
+                    elapsed = time.perf_counter() - begin
+                    best = elapsed if best is None else min(best, elapsed)
+                print('%-12s %-20s %10.2f %12.0f' % (loop, backend, best, args.n / best))
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+导入耗时基准测试，基于python -X importtime
+检查导入xyw_eyes各包时是否加载了不应加载的重量级依赖，以及累计导入耗时是否超出预算，出现退化时以非零状态码退出
+用法：python benchmark/import_time.py [--repeat 5] [--scale 1.0]
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(root_path)
+sys.path.append(root_path)
+
+# 导入语句、不允许加载的模块以及累计耗时预算（毫秒）
+CASES = [
+    ('import xyw_eyes', ('aiohttp', 'lxml', 'aiofiles', 'dateutil'), 30),
+    ('import xyw_eyes.rss', ('aiohttp', 'lxml', 'aiofiles', 'dateutil'), 30),
+    ('from xyw_eyes.rss import RSS2, RSSItem, Guid', ('aiohttp', 'lxml', 'aiofiles', 'dateutil'), 50),
+    ('from xyw_eyes.rss import merge_rss', ('aiohttp', 'lxml', 'aiofiles', 'dateutil'), 100),
+    ('import xyw_eyes.spider', ('aiohttp', 'lxml', 'aiofiles', 'dateutil'), 30),
+]
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def measure(statement: str):
+    """
+    在新的解释器中执行导入语句
+    :param statement:
+    :return: (累计耗时毫秒数, 加载的模块集合)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, cwd=root_path, universal_newlines=True, check=True
+    )
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        modules.add(match.group(4))
+        # 只累加最外层的导入，内层导入已经包含在外层的累计耗时中
+        if len(match.group(3)) == 1:
+            total += int(match.group(2))
+    return total / 1000, modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5, help='每条语句的测量次数，取最小值')
+    parser.add_argument('--scale', type=float, default=1.0, help='耗时预算的缩放系数，较慢的机器上可以调大')
+    args = parser.parse_args()
+
+    failed = False
+    for statement, forbidden, budget in CASES:
+        runs = [measure(statement) for _ in range(args.repeat)]
+        cost = min(run[0] for run in runs)
+        loaded = sorted(name for name in forbidden if any(
+            module == name or module.startswith(name + '.') for module in runs[0][1]
+        ))
+        ok = not loaded and cost <= budget * args.scale
+        failed = failed or not ok
+        print('%-4s %-50s %8.1f ms (预算 %d ms)%s' % (
+            'ok' if ok else 'FAIL', statement, cost, budget * args.scale,
+            '，加载了 %s' % ', '.join(loaded) if loaded else ''
+        ))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+内存占用基准测试，统计RSSItem（含Guid、Category、Enclosure）、Item以及Request每个对象占用的字节数
+用法：python benchmark/memory.py [-n 100000] [--compare <git版本>]
+指定--compare时会从该git版本中读取对应模块的源码，按同样的方式测量，用于对比修改前后的内存占用
+"""
+import os
+import sys
+import types
+import argparse
+import datetime
+import tracemalloc
+import subprocess
+
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(root_path)
+sys.path.append(root_path)
+
+MODULES = {
+    'rss': ('xyw_eyes/rss/rss.py', 'xyw_eyes.rss.rss'),
+    'request': ('xyw_eyes/spider/request.py', 'xyw_eyes.spider.request'),
+    'item': ('xyw_eyes/spider/item.py', 'xyw_eyes.spider.item'),
+}
+
+# 所有对象共用相同的字符串，使测量结果只反映对象本身的开销
+TITLE = '标题'
+LINK = 'https://www.example.com/item'
+DESCRIPTION = '<div>描述</div>'
+PUB_DATE = datetime.datetime(2021, 7, 1, 20, 0)
+
+
+def load(key: str, revision: str = None) -> types.ModuleType:
+    """
+    加载当前版本或指定git版本中的模块
+    :param key:
+    :param revision:
+    :return:
+    """
+    path, name = MODULES[key]
+    if revision is None:
+        __import__(name)
+        return sys.modules[name]
+    source = subprocess.run(
+        ['git', 'show', '%s:%s' % (revision, path)], stdout=subprocess.PIPE, check=True, cwd=root_path
+    ).stdout.decode('utf-8')
+    module = types.ModuleType('%s_%s' % (name.replace('.', '_'), revision))
+    module.__file__ = path
+    # dataclass需要在sys.modules中找到所在模块
+    sys.modules[module.__name__] = module
+    exec(compile(source.replace("if __name__ == '__main__':", 'if False:'), path, 'exec'), module.__dict__)
+    return module
+
+
+def measure(factory, n: int) -> float:
+    """
+    创建n个对象，返回平均每个对象新增的内存字节数
+    :param factory:
+    :param n:
+    :return:
+    """
+    objects = [None] * n
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(n):
+        objects[i] = factory()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / n
+
+
+def factories(revision: str = None) -> dict:
+    rss = load('rss', revision)
+    request = load('request', revision)
+    item = load('item', revision)
+    shared_request = request.Request(LINK)
+    return {
+        'RSSItem': lambda: rss.RSSItem(
+            title=TITLE,
+            link=LINK,
+            description=DESCRIPTION,
+            categories=[rss.Category(TITLE)],
+            enclosure=rss.Enclosure(LINK, 1024, 'audio/mpeg'),
+            guid=rss.Guid(LINK, isPermaLink=False),
+            pubDate=PUB_DATE
+        ),
+        'Item': lambda: item.Item({'title': TITLE}, shared_request),
+        'Request': lambda: request.Request(LINK),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=100000, help='每种对象创建的数量')
+    parser.add_argument('--compare', default=None, help='用于对比的git版本，例如修改前的提交')
+    args = parser.parse_args()
+
+    current = {name: measure(factory, args.n) for name, factory in factories().items()}
+    if args.compare is None:
+        print('%-10s %12s' % ('对象', '字节/个'))
+        for name, size in current.items():
+            print('%-10s %12.1f' % (name, size))
+        return
+
+    previous = {name: measure(factory, args.n) for name, factory in factories(args.compare).items()}
+    print('%-10s %14s %12s %10s' % ('对象', args.compare + '(字节/个)', '当前(字节/个)', '减少'))
+    for name, size in current.items():
+        print('%-10s %14.1f %12.1f %9.1f%%' % (name, previous[name], size, (1 - size / previous[name]) * 100))
+
+
+if __name__ == '__main__':
+    main()
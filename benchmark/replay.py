@@ -0,0 +1,80 @@
+"""
+离线回放基准测试：先在记录模式下运行一次爬虫，保存全部响应，之后在回放模式下多次运行，测量parse和item_pipeline的耗时
+用法：
+    python benchmark/replay.py spider/douyu.py --record archive.rec
+    python benchmark/replay.py spider/douyu.py --replay archive.rec [--latency 0.05] [--repeat 5]
+回放模式不访问网络，request_delay视为0，爬虫输出的文件和日志写入临时目录
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import importlib.util
+
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(root_path)
+sys.path.append(root_path)
+
+from xyw_eyes.spider import Spider
+
+
+def load_spider(path: str) -> type:
+    """
+    导入爬虫文件，返回其中定义的Spider子类
+    :param path:
+    :return:
+    """
+    spec = importlib.util.spec_from_file_location('benchmark_target', os.path.abspath(path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # 爬虫文件导入时会切换工作目录，这里切换回来
+    os.chdir(root_path)
+    for value in vars(module).values():
+        if isinstance(value, type) and issubclass(value, Spider) and value.__module__ == module.__name__:
+            return value
+    raise ValueError('no spider found in %s' % path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('spider', help='爬虫文件路径')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--record', help='记录响应的存档文件路径')
+    mode.add_argument('--replay', help='回放响应的存档文件路径')
+    parser.add_argument('--latency', type=float, default=0.0, help='回放时每个响应模拟的延迟（秒）')
+    parser.add_argument('--repeat', type=int, default=5, help='回放的次数')
+    args = parser.parse_args()
+
+    spider_class = load_spider(args.spider)
+    archive = os.path.abspath(args.record or args.replay)
+    # 爬虫的输出文件和日志文件写入临时目录
+    os.chdir(tempfile.mkdtemp())
+    if args.record:
+        spider_class.record_archive = archive
+        spider_class().run()
+        print('已记录到 %s，共 %d 字节' % (archive, os.path.getsize(archive)))
+        return
+
+    spider_class.replay_archive = archive
+    spider_class.replay_latency = args.latency
+    spider_class.request_delay = 0
+    # 不输出日志，避免日志开销影响结果
+    logging.disable(logging.CRITICAL)
+    timings = []
+    for _ in range(args.repeat):
+        spider = spider_class()
+        begin = time.perf_counter()
+        spider.run()
+        timings.append(time.perf_counter() - begin)
+        if spider.downloader.misses:
+            print('存档中缺少 %d 个request的记录' % spider.downloader.misses)
+    timings.sort()
+    print('回放 %d 次，最快 %.3f s，中位数 %.3f s，最慢 %.3f s' % (
+        len(timings), timings[0], timings[len(timings) // 2], timings[-1]
+    ))
+
+
+if __name__ == '__main__':
+    main()
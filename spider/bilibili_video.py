@@ -10,7 +10,7 @@ os.chdir(root_path)
 sys.path.append(root_path)
 
 from xyw_eyes.spider import Spider
-from xyw_eyes.rss import RSS2, RSSItem, Guid, div, img
+from xyw_eyes.rss import RSS2, ItemStore, RSSItem, Guid, FeedCompactor, div, img
 
 
 class Video(Spider):
@@ -26,6 +26,9 @@ class Video(Spider):
         '10462362'
     ]
     request_delay = 5
+    # 开启后按投稿频率调整每个Up主的爬取间隔，最长6小时检查一次，需要配合定时任务频繁运行
+    adaptive_polling = False
+    poll_max_interval = 6 * 3600
 
     async def init(self):
         self.rss = RSS2(
@@ -33,6 +36,8 @@ class Video(Spider):
             link='https://www.bilibili.com/',
             description='关注B站Up主的最新视频投稿'
         )
+        # 保存历史item，RSS文件中始终包含最新的50个item，而不只是本次抓取到的
+        self.store = ItemStore('./xml/items.db', feed=self.name)
 
     async def request_middlewares(self, request):
         request.url = 'https://api.bilibili.com/x/space/arc/search?mid={}&ps=10&tid=0&pn=1&order=pubdate&jsonp=jsonp'\
@@ -68,11 +73,14 @@ class Video(Spider):
                'width="650" height="477" scrolling="no" border="0" frameborder="no" framespacing="0" ' \
                'allowfullscreen="true"></iframe>'.format(url)
 
+    def item_keys(self, item):
+        return [video['bvid'] or str(video['aid']) for video in item['data']]
+
     async def item_pipeline(self, item):
         vlist = item['data']
         for item in vlist:
             link = 'https://www.bilibili.com/video/{}'.format(item['bvid']) if item['created'] > 1589990400 and item['bvid'] else 'https://www.bilibili.com/video/av{}'.format(item['aid'])
-            self.rss.items.append(
+            self.store.put(
                 RSSItem(
                     title='【{}】 {}'.format(item['author'], item['title']),
                     description=img(item['pic']) + div(item['description']) + self.video_link(item),
@@ -86,8 +94,24 @@ class Video(Spider):
             )
 
     async def end(self) -> None:
-        self.rss.set_build_time_now()
-        await self.rss.async_write('./xml/' + self.name + '.xml')
+        self.store.flush()
+        self.logger.info('新增item %d 个' % len(self.store.new_items))
+        self.store.materialize(self.rss, n=50)
+        self.store.prune(keep=500)
+        self.store.close()
+        # 压缩description中的html，超过8KB的简介截断并链接到原视频
+        compactor = FeedCompactor(max_bytes=8192)
+        compactor.compact(self.rss, self.name)
+        for line in compactor.report():
+            self.logger.info(line)
+        # 开启adaptive_polling时ttl与最活跃的起始链接的爬取间隔一致
+        if self.poll is not None:
+            self.rss.ttl = self.poll.ttl()
+        # 内容没有变化时不重写文件，也不更新lastBuildDate
+        if await self.rss.async_write('./xml/' + self.name + '.xml', only_changed=True):
+            self.logger.info('RSS文件已更新')
+        else:
+            self.logger.info('RSS内容没有变化，跳过写入')
 
 
 if __name__ == '__main__':
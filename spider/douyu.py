@@ -10,7 +10,7 @@ os.chdir(root_path)
 sys.path.append(root_path)
 
 from xyw_eyes.spider import Spider
-from xyw_eyes.rss import RSS2, RSSItem, Guid, div, img, parse_string_to_datetime
+from xyw_eyes.rss import RSS2, ItemStore, RSSItem, Guid, div, img, parse_string_to_datetime
 
 
 class DouYu(Spider):
@@ -23,6 +23,9 @@ class DouYu(Spider):
         '93589',
     ]
     request_delay = 5
+    # 开启后按开播频率调整每个房间的爬取间隔，最长1小时检查一次，需要配合定时任务频繁运行
+    adaptive_polling = False
+    poll_max_interval = 3600
 
     async def init(self):
         self.rss = RSS2(
@@ -30,6 +33,8 @@ class DouYu(Spider):
             link='https://www.douyu.com/directory/myFollow',
             description='使用斗鱼第三方api接口监控关注主播的开播信息'
         )
+        # 保存历史item，RSS文件中始终包含最新的50个item，而不只是本次抓取到的
+        self.store = ItemStore('./xml/items.db', feed=self.name)
 
     async def request_middlewares(self, request):
         request.url = 'http://open.douyucdn.cn/api/RoomApi/room/' + request.url
@@ -53,8 +58,12 @@ class DouYu(Spider):
             'link': 'https://www.douyu.com/' + data['data']['room_id']
         }
 
+    def item_keys(self, item):
+        # 同一房间每次开播的链接相同，加上开播时间区分
+        return [item['link'] + item['pubDate']]
+
     async def item_pipeline(self, item):
-        self.rss.items.append(
+        self.store.put(
             RSSItem(
                 title=item['title'],
                 description=item['description'],
@@ -63,13 +72,24 @@ class DouYu(Spider):
                     guid=item['link'] + item['pubDate'],
                     isPermaLink=False
                 ),
-                pubDate=parse_string_to_datetime(item['pubDate'])
+                pubDate=parse_string_to_datetime(item['pubDate'], self.name)
             )
         )
 
     async def end(self) -> None:
-        self.rss.set_build_time_now()
-        await self.rss.async_write('./xml/' + self.name + '.xml')
+        self.store.flush()
+        self.logger.info('新增item %d 个' % len(self.store.new_items))
+        self.store.materialize(self.rss, n=50)
+        self.store.prune(keep=500)
+        self.store.close()
+        # 开启adaptive_polling时ttl与最活跃的起始链接的爬取间隔一致
+        if self.poll is not None:
+            self.rss.ttl = self.poll.ttl()
+        # 内容没有变化时不重写文件，也不更新lastBuildDate
+        if await self.rss.async_write('./xml/' + self.name + '.xml', only_changed=True):
+            self.logger.info('RSS文件已更新')
+        else:
+            self.logger.info('RSS内容没有变化，跳过写入')
 
 
 if __name__ == '__main__':
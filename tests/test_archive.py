@@ -0,0 +1,50 @@
+import os
+import datetime
+
+from lxml import etree
+
+from xyw_eyes.rss.rss import RSS2, RSSItem, Guid
+from xyw_eyes.rss.reader import read_feed
+from xyw_eyes.rss.archive import FeedArchiver, ATOM_NS
+
+
+def _items(numbers):
+    start = datetime.datetime(2021, 7, 1, tzinfo=datetime.timezone.utc)
+    return [RSSItem(title=str(n), link='https://example.com/%d' % n, guid=Guid('https://example.com/%d' % n),
+                    pubDate=start + datetime.timedelta(hours=n)) for n in numbers]
+
+
+def _prev_archive(path):
+    for link in etree.parse(path).iter('{%s}link' % ATOM_NS):
+        if link.get('rel') == 'prev-archive':
+            return link.get('href')
+    return None
+
+
+def test_several_pages_in_one_update(tmp_path):
+    path = str(tmp_path / 'feed.xml')
+    archiver = FeedArchiver(path, RSS2('t', 'https://example.com', 'd'), page_size=2)
+    archiver.update(_items(range(1, 10)))
+
+    assert [item.title for item in read_feed(path)] == ['9', '8', '7']
+    # 从当前文档沿prev-archive依次访问存档页，item应当越来越旧
+    pages = []
+    href = _prev_archive(path)
+    while href is not None:
+        page = os.path.join(str(tmp_path), href)
+        pages.append([item.title for item in read_feed(page)])
+        href = _prev_archive(page)
+    assert pages == [['6', '5'], ['4', '3'], ['2', '1']]
+    assert archiver.page_count() == 3
+
+
+def test_new_page_links_previous(tmp_path):
+    path = str(tmp_path / 'feed.xml')
+    archiver = FeedArchiver(path, RSS2('t', 'https://example.com', 'd'), page_size=2)
+    archiver.update(_items(range(1, 6)))
+    archiver.update(_items(range(6, 8)))
+
+    assert archiver.page_count() == 2
+    assert [item.title for item in read_feed(archiver.page_path(1))] == ['2', '1']
+    assert [item.title for item in read_feed(archiver.page_path(2))] == ['4', '3']
+    assert _prev_archive(path) == 'feed/archive-2.xml'
@@ -0,0 +1,27 @@
+from xyw_eyes.rss.compact import minify_html, truncate_html
+
+
+def test_keeps_ideographic_and_no_break_spaces():
+    html = '<p>　　第一段</p>\n<p>a\xa0\xa0b</p>'
+    assert minify_html(html) == '<p>　　第一段</p><p>a\xa0\xa0b</p>'
+
+
+def test_collapses_html_whitespace():
+    assert minify_html('<div>\n  <p>  hello\n\t world </p>\n</div>') == '<div><p>hello world</p></div>'
+
+
+def test_removed_comment_does_not_leave_double_space():
+    assert minify_html('a <!-- c --> b') == 'a b'
+
+
+def test_redundant_attributes_and_repeated_images():
+    html = '<img src="a.jpg" class=""><iframe src="x" border="0" allowfullscreen="true"></iframe><img src="a.jpg">'
+    assert minify_html(html) == '<img src="a.jpg"><iframe src="x" allowfullscreen></iframe><img src="a.jpg">'
+    assert minify_html(html, dedup_assets=True) == '<img src="a.jpg"><iframe src="x" allowfullscreen></iframe>'
+
+
+def test_truncate_closes_tags_and_links():
+    html = '<div><p>' + 'abc ' * 50 + '</p></div>'
+    result = truncate_html(html, 40, 'https://example.com/1')
+    assert result.endswith('…</p></div> <a href="https://example.com/1">阅读全文</a>')
+    assert len(result.split(' <a href')[0].encode('utf-8')) <= 40
@@ -0,0 +1,27 @@
+from xyw_eyes.rss.reader import read_feed
+
+
+def test_rss_item_with_comment_and_pi():
+    data = b'''<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>t</title>
+<item><!-- comment --><title>1</title><?pi data?><link>https://example.com/1</link>
+<guid>https://example.com/1</guid><description>a<!-- inner -->b</description></item>
+</channel></rss>'''
+    items = list(read_feed(data))
+    assert len(items) == 1
+    assert items[0].title == '1'
+    assert items[0].link == 'https://example.com/1'
+    assert items[0].description == 'ab'
+
+
+def test_atom_entry_with_comment_and_pi():
+    data = b'''<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom"><title>t</title>
+<entry><!-- comment --><title>1</title><?pi data?><id>urn:1</id>
+<link href="https://example.com/1"/></entry>
+</feed>'''
+    items = list(read_feed(data))
+    assert len(items) == 1
+    assert items[0].title == '1'
+    assert items[0].link == 'https://example.com/1'
+    assert items[0].guid.guid == 'urn:1'
@@ -1,2 +1,14 @@
-import xyw_eyes.spider
-import xyw_eyes.rss
+import importlib
+
+# 子包在第一次访问时才导入，避免导入xyw_eyes时加载aiohttp、lxml等较重的依赖
+_submodules = ('spider', 'rss', 'logger')
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('xyw_eyes.' + name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules))
@@ -1,3 +1,33 @@
-from xyw_eyes.rss.rss import RSS2, img, cdata, Image, Cloud, RSSItem, Guid, Category, TextInput, Source, SkipDays, \
-    SkipHours, Enclosure, div, parse_string_to_datetime
-from xyw_eyes.rss.merge import merge_rss
+import importlib
+
+# 对外提供的名称及其所在模块，第一次访问时才导入，只写入或只合并rss文件时不会加载用不到的依赖
+_lazy = {name: 'xyw_eyes.rss.rss' for name in (
+    'RSS2', 'img', 'cdata', 'Image', 'Cloud', 'RSSItem', 'Guid', 'Category', 'TextInput', 'Source', 'SkipDays',
+    'SkipHours', 'Enclosure', 'div', 'parse_string_to_datetime'
+)}
+_lazy['merge_rss'] = 'xyw_eyes.rss.merge'
+_lazy['FeedPublisher'] = 'xyw_eyes.rss.publish'
+_lazy['read_feed'] = 'xyw_eyes.rss.reader'
+_lazy['item_key'] = 'xyw_eyes.rss.reader'
+_lazy['ItemStore'] = 'xyw_eyes.rss.store'
+_lazy['FeedArchiver'] = 'xyw_eyes.rss.archive'
+_lazy['ArchivedRSS2'] = 'xyw_eyes.rss.archive'
+_lazy['FeedNotifier'] = 'xyw_eyes.rss.notify'
+_lazy['FeedHub'] = 'xyw_eyes.rss.notify'
+_lazy['FeedCompactor'] = 'xyw_eyes.rss.compact'
+_lazy['minify_html'] = 'xyw_eyes.rss.compact'
+_lazy['truncate_html'] = 'xyw_eyes.rss.compact'
+
+__all__ = list(_lazy)
+
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    value = getattr(importlib.import_module(_lazy[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
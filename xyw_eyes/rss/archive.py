@@ -0,0 +1,180 @@
+import os
+import re
+from typing import List, Optional, Tuple, Iterable
+
+from xyw_eyes.rss.rss import RSS2, RSSItem, _element
+from xyw_eyes.rss.dateparse import to_timestamp
+from xyw_eyes.rss.reader import read_feed, item_key
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+# RFC 5005 Feed History
+FH_NS = 'http://purl.org/syndication/history/1.0'
+
+_PAGE = re.compile(r'^archive-(\d+)\.xml$')
+
+
+class ArchivedRSS2(RSS2):
+    """
+    带有RFC 5005链接的RSS2，用于分页存档中的当前文档和存档页
+    当前文档包含current和prev-archive链接，存档页额外包含fh:archive标记以及next-archive链接
+    """
+
+    rss_attrs = {'version': '2.0', 'xmlns:atom': ATOM_NS, 'xmlns:fh': FH_NS}
+
+    def __init__(self, *args, links: Optional[List[Tuple[str, str]]] = None, archive: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (rel, href)组成的列表
+        self.links = links if links is not None else []
+        self.archive = archive
+
+    @classmethod
+    def from_rss(cls, rss: RSS2, items: List[RSSItem], links: List[Tuple[str, str]],
+                 archive: bool = False) -> 'ArchivedRSS2':
+        """
+        复制RSS2的channel属性创建新的文档
+        :param rss: 提供channel属性的RSS2
+        :param items:
+        :param links:
+        :param archive: 是否为存档页
+        :return:
+        """
+        page = cls.__new__(cls)
+        page.__dict__.update(rss.__dict__)
+        page.items = items
+        page.links = links
+        page.archive = archive
+        return page
+
+    def publish_extensions(self, handler):
+        for rel, href in self.links:
+            _element(handler, 'atom:link', None, {'rel': rel, 'href': href})
+        if self.archive:
+            _element(handler, 'fh:archive', None)
+
+
+class FeedArchiver:
+    """
+    将RSS文件拆分为较小的当前文档和不再变化的存档页（RFC 5005），订阅者每次只需下载当前文档
+    当前文档最多包含2倍page_size个item，超过时最旧的page_size个item移入新的存档页
+    每次更新只重写当前文档，新建存档页时再为上一个存档页补充next-archive链接
+    存档页保存在与当前文档同名的目录中，例如xml/douyu.xml的存档页为xml/douyu/archive-1.xml，编号越大越新
+    """
+
+    def __init__(self, path: str, rss: RSS2, base_url: Optional[str] = None, page_size: int = 50):
+        """
+        :param path: 当前文档的路径
+        :param rss: 提供channel属性的RSS2，其items会被忽略
+        :param base_url: 当前文档所在目录的链接，例如https://example.com/xml/，为None时使用相对链接
+        :param page_size: 每个存档页的item数量
+        """
+        if page_size < 1:
+            raise ValueError('page_size must be no less than 1')
+        self.path = path
+        self.rss = rss
+        self.base_url = base_url
+        self.page_size = page_size
+        name = os.path.splitext(os.path.basename(path))[0]
+        self.archive_dir = os.path.join(os.path.dirname(path), name)
+        self._name = name
+
+    def _href(self, page: Optional[int] = None) -> str:
+        relative = self._name + '.xml' if page is None else '%s/archive-%d.xml' % (self._name, page)
+        if self.base_url is None:
+            return relative
+        return self.base_url.rstrip('/') + '/' + relative
+
+    def page_path(self, page: int) -> str:
+        return os.path.join(self.archive_dir, 'archive-%d.xml' % page)
+
+    def page_count(self) -> int:
+        """
+        :return: 已有的存档页数量
+        """
+        if not os.path.isdir(self.archive_dir):
+            return 0
+        pages = [int(match.group(1)) for match in map(_PAGE.match, os.listdir(self.archive_dir)) if match]
+        return max(pages) if pages else 0
+
+    def current_items(self) -> List[RSSItem]:
+        """
+        读取当前文档中的item
+        :return:
+        """
+        if not os.path.isfile(self.path):
+            return []
+        return list(read_feed(self.path))
+
+    def _archive_links(self, page: int, newest: int) -> List[Tuple[str, str]]:
+        links = [('current', self._href())]
+        if page > 1:
+            links.append(('prev-archive', self._href(page - 1)))
+        if page < newest:
+            links.append(('next-archive', self._href(page + 1)))
+        return links
+
+    def plan(self, items: Iterable[RSSItem]) -> List[Tuple[str, ArchivedRSS2]]:
+        """
+        计算本次更新需要写入的文件
+        :param items: 新的item，已经存在于当前文档中的item会被新数据替换
+        :return: (文件路径, 文档)组成的列表，存档页在前，当前文档在最后
+        """
+        merged = {}
+        order = []
+        for item in list(items) + self.current_items():
+            key = item_key(item)
+            if key is None:
+                key = id(item)
+            if key not in merged:
+                merged[key] = item
+                order.append(key)
+        # 按发布时间从新到旧排列，没有发布时间的视为最新
+        current = sorted((merged[key] for key in order),
+                         key=lambda item: -(to_timestamp(item.pubDate) or float('inf')))
+
+        writes = []
+        pages = self.page_count()
+        new_pages = []
+        while len(current) > 2 * self.page_size:
+            new_pages.append(current[-self.page_size:])
+            current = current[:-self.page_size]
+        if new_pages:
+            newest = pages + len(new_pages)
+            if pages:
+                # 上一个存档页只需要补充next-archive链接，item不变
+                previous = list(read_feed(self.page_path(pages)))
+                writes.append((self.page_path(pages), ArchivedRSS2.from_rss(
+                    self.rss, previous, self._archive_links(pages, newest), archive=True
+                )))
+            # 每次从末尾取出最旧的item，new_pages中越靠前越旧，编号越小
+            for offset, page_items in enumerate(new_pages, 1):
+                page = pages + offset
+                writes.append((self.page_path(page), ArchivedRSS2.from_rss(
+                    self.rss, page_items, self._archive_links(page, newest), archive=True
+                )))
+            pages = newest
+
+        links = [('current', self._href())]
+        if pages:
+            links.append(('prev-archive', self._href(pages)))
+        writes.append((self.path, ArchivedRSS2.from_rss(self.rss, current, links)))
+        return writes
+
+    def update(self, items: Iterable[RSSItem]) -> List[str]:
+        """
+        写入新的item
+        :param items:
+        :return: 实际写入的文件路径
+        """
+        return [path for path, page in self.plan(items) if page.write(path, only_changed=True)]
+
+    async def async_update(self, items: Iterable[RSSItem]) -> List[str]:
+        """
+        异步写入新的item
+        :param items:
+        :return: 实际写入的文件路径
+        """
+        written = []
+        for path, page in self.plan(items):
+            if await page.async_write(path, only_changed=True):
+                written.append(path)
+        return written
@@ -0,0 +1,267 @@
+import re
+from typing import Optional, Dict, List, Tuple
+
+from xyw_eyes.rss.rss import RSS2, RSSItem
+
+# 依次匹配注释、结束标签、开始标签以及文本，无法识别的'<'按文本处理
+_TOKEN = re.compile(
+    r'(?P<comment><!--.*?-->)'
+    r'|(?P<end></(?P<end_name>[a-zA-Z][\w:-]*)\s*>)'
+    r'|(?P<start><(?P<name>[a-zA-Z][\w:-]*)(?P<attrs>(?:\s+[^\s"\'<>/=]+(?:\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s"\'=<>`]+))?)*)'
+    r'\s*(?P<close>/?)>)'
+    r'|(?P<text>[^<]+|<)',
+    re.S
+)
+_ATTR = re.compile(r'([^\s"\'<>/=]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s"\'=<>`]+))?')
+# 只合并HTML中的空白字符，全角空格（U+3000）和不换行空格（U+00A0）会显示出来，需要保留
+_SPACE = re.compile(r'[ \t\n\r\f]+')
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+# 内容需要原样保留的元素
+RAW_TAGS = {'pre', 'textarea', 'script', 'style'}
+# 前后的空白可以删除的块级元素
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'body', 'br', 'dd', 'details', 'div', 'dl', 'dt', 'figcaption',
+    'figure', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'html', 'li', 'main', 'nav', 'ol', 'p',
+    'section', 'summary', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+}
+# 只需要属性名即可生效的布尔属性
+BOOLEAN_ATTRS = {
+    'allowfullscreen', 'async', 'autofocus', 'autoplay', 'checked', 'controls', 'default', 'defer', 'disabled',
+    'hidden', 'ismap', 'loop', 'multiple', 'muted', 'nomodule', 'novalidate', 'open', 'playsinline', 'readonly',
+    'required', 'reversed', 'selected',
+}
+# 值为空时没有作用的属性
+EMPTY_ATTRS = {'class', 'style', 'id', 'title'}
+# 与浏览器默认值相同或已经没有作用的属性，(元素, 属性名, 值)，值为None时不论取值都删除
+REDUNDANT_ATTRS = {
+    ('script', 'type', 'text/javascript'),
+    ('style', 'type', 'text/css'),
+    ('link', 'type', 'text/css'),
+    ('form', 'method', 'get'),
+    ('input', 'type', 'text'),
+    ('iframe', 'framespacing', None),
+    ('iframe', 'border', None),
+}
+
+
+def _attributes(tag: str, raw: str) -> str:
+    parts = []
+    for name, value in _ATTR.findall(raw):
+        lower = name.lower()
+        bare = not value
+        if value[:1] in ('"', "'"):
+            value = value[1:-1]
+        if lower in BOOLEAN_ATTRS:
+            parts.append(name)
+            continue
+        if lower == 'class':
+            value = _SPACE.sub(' ', value).strip(' ')
+        if (not value and lower in EMPTY_ATTRS) or (tag, lower, None) in REDUNDANT_ATTRS \
+                or (tag, lower, value.lower()) in REDUNDANT_ATTRS:
+            continue
+        if bare:
+            parts.append(name)
+        else:
+            # 保留原始的实体写法，只在值中包含双引号时使用单引号
+            parts.append('%s=%s%s%s' % (name, *(("'", value, "'") if '"' in value else ('"', value, '"'))))
+    return ''.join(' ' + part for part in parts)
+
+
+def _tokens(html: str) -> List[Tuple[str, str, str]]:
+    """
+    :return: (类型, 元素名, 原始文本)组成的列表，类型为'start'、'end'、'text'或'comment'
+    """
+    tokens = []
+    raw_tag = None
+    for match in _TOKEN.finditer(html):
+        if raw_tag is not None:
+            # script、pre等元素中的内容原样保留，直到对应的结束标签
+            if match.group('end') and match.group('end_name').lower() == raw_tag:
+                tokens.append(('end', raw_tag, match.group(0)))
+                raw_tag = None
+            else:
+                tokens.append(('raw', raw_tag, match.group(0)))
+            continue
+        if match.group('comment'):
+            tokens.append(('comment', '', match.group(0)))
+        elif match.group('end'):
+            tokens.append(('end', match.group('end_name').lower(), match.group(0)))
+        elif match.group('start'):
+            name = match.group('name').lower()
+            tokens.append(('start', name, match.group(0)))
+            if name in RAW_TAGS and not match.group('close'):
+                raw_tag = name
+        else:
+            tokens.append(('text', '', match.group(0)))
+    return tokens
+
+
+def minify_html(html: str, dedup_assets: bool = False) -> str:
+    """
+    压缩html：删除注释（保留条件注释）、合并空白、删除块级元素前后的空白、删除冗余的属性，
+    pre、textarea、script、style中的内容原样保留
+    :param html:
+    :param dedup_assets: 是否删除重复出现的相同图片，作者有意重复的图片也会被删除，默认不删除
+    :return:
+    """
+    out: List[Tuple[str, str, str]] = []
+    images = set()
+    for kind, name, raw in _tokens(html):
+        if kind == 'comment':
+            if raw.startswith('<!--[if'):
+                out.append((kind, name, raw))
+            continue
+        if kind == 'start':
+            match = _TOKEN.match(raw)
+            attrs = _attributes(name, match.group('attrs'))
+            if dedup_assets and name == 'img':
+                if attrs in images:
+                    continue
+                images.add(attrs)
+            raw = '<%s%s%s>' % (match.group('name'), attrs, '/' if match.group('close') and name not in VOID_TAGS
+                                else '')
+        elif kind == 'end':
+            raw = '</%s>' % name
+        elif kind == 'text':
+            # 删除注释后前后两段文本相邻，需要合并后再合并空白
+            if out and out[-1][0] == 'text':
+                raw = out.pop()[2] + raw
+            raw = _SPACE.sub(' ', raw)
+            # 块级元素前后以及开头的空白没有作用
+            if raw.startswith(' ') and (not out or (out[-1][0] in ('start', 'end') and out[-1][1] in BLOCK_TAGS)):
+                raw = raw[1:]
+            if not raw:
+                continue
+        out.append((kind, name, raw))
+    # 删除块级元素之前以及末尾的空白
+    for index, (kind, name, raw) in enumerate(out):
+        if kind == 'text' and raw.endswith(' '):
+            following = out[index + 1] if index + 1 < len(out) else None
+            if following is None or (following[0] in ('start', 'end') and following[1] in BLOCK_TAGS):
+                out[index] = (kind, name, raw[:-1])
+    return ''.join(raw for _, _, raw in out)
+
+
+def truncate_html(html: str, max_bytes: int, link: Optional[str] = None, more_text: str = '阅读全文') -> str:
+    """
+    将html截断到不超过max_bytes字节（utf-8，不包括末尾的链接），只在文本或标签之间截断，并补全未关闭的标签
+    :param html:
+    :param max_bytes:
+    :param link: 截断后追加的“阅读全文”链接，为None时只追加省略号
+    :param more_text: 链接的文字
+    :return: 没有超过max_bytes时原样返回
+    """
+    if len(html.encode('utf-8')) <= max_bytes:
+        return html
+    parts = []
+    opened = []
+    size = len('…'.encode('utf-8'))
+    for kind, name, raw in _tokens(html):
+        closing = sum(len(tag) + 3 for tag in opened)
+        length = len(raw.encode('utf-8'))
+        if size + length + closing > max_bytes:
+            if kind == 'text':
+                room = max_bytes - size - closing
+                text = raw.encode('utf-8')[:max(room, 0)].decode('utf-8', 'ignore')
+                # 避免截断实体
+                amp = text.rfind('&')
+                if amp >= 0 and ';' not in text[amp:]:
+                    text = text[:amp]
+                parts.append(text)
+            break
+        parts.append(raw)
+        size += length
+        if kind == 'start' and name not in VOID_TAGS and not raw.endswith('/>'):
+            opened.append(name)
+        elif kind == 'end' and name in opened:
+            # 关闭最近一个同名元素，以及其中没有关闭的元素
+            while opened and opened.pop() != name:
+                pass
+    parts.append('…')
+    parts.extend('</%s>' % name for name in reversed(opened))
+    if link is not None:
+        parts.append(' <a href="%s">%s</a>' % (link.replace('"', '&quot;'), more_text))
+    return ''.join(parts)
+
+
+class FeedCompactor:
+    """
+    RSS文件写入前的压缩处理：压缩item的description中的html，可选地截断超过字节数上限的description并追加“阅读全文”链接，
+    按RSS文件统计压缩前后的字节数
+    """
+
+    def __init__(self, max_bytes: int = 0, more_text: str = '阅读全文', minify: bool = True,
+                 dedup_assets: bool = False):
+        """
+        :param max_bytes: description的字节数上限，为0时不截断
+        :param more_text: 截断后追加的链接文字，链接为item的link
+        :param minify: 是否压缩html
+        :param dedup_assets: 是否删除同一description中重复出现的相同图片
+        """
+        self.max_bytes = max_bytes
+        self.more_text = more_text
+        self.minify = minify
+        self.dedup_assets = dedup_assets
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def compact_item(self, item: RSSItem) -> Tuple[int, int, bool]:
+        """
+        压缩item的description
+        :param item:
+        :return: (压缩前的字节数, 压缩后的字节数, 是否被截断)
+        """
+        description = item.description
+        if not isinstance(description, str):
+            return 0, 0, False
+        before = len(description.encode('utf-8'))
+        if self.minify:
+            description = minify_html(description, self.dedup_assets)
+        truncated = False
+        if self.max_bytes and len(description.encode('utf-8')) > self.max_bytes:
+            description = truncate_html(description, self.max_bytes, item.link, self.more_text)
+            truncated = True
+        item.description = description
+        return before, len(description.encode('utf-8')), truncated
+
+    def compact(self, rss: RSS2, name: Optional[str] = None) -> Dict[str, int]:
+        """
+        压缩RSS中所有item的description
+        :param rss:
+        :param name: 统计时使用的名称，默认为RSS的title
+        :return: 本次的统计数据
+        """
+        stats = {'items': 0, 'before': 0, 'after': 0, 'truncated': 0}
+        for item in rss.items:
+            before, after, truncated = self.compact_item(item)
+            stats['items'] += 1
+            stats['before'] += before
+            stats['after'] += after
+            stats['truncated'] += truncated
+        self._stats[name if name is not None else rss.title] = stats
+        return stats
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        各RSS文件最近一次压缩的统计数据：item数、压缩前后description的字节数以及被截断的item数
+        :return:
+        """
+        return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def report(self) -> List[str]:
+        """
+        :return: 每个RSS文件一行的统计结果
+        """
+        lines = []
+        for name, stats in self._stats.items():
+            saved = stats['before'] - stats['after']
+            lines.append('%s：item %d 个，description共 %d 字节，压缩后 %d 字节，节省 %d 字节（%.1f%%），截断 %d 个'
+                         % (name, stats['items'], stats['before'], stats['after'], saved,
+                            saved * 100 / stats['before'] if stats['before'] else 0, stats['truncated']))
+        return lines
+
+
+if __name__ == '__main__':
+    print(minify_html('<div>\n  <img src="a.jpg" referrerpolicy="no-referrer" class="">\n  <p>  hello\n world </p>\n'
+                      '<!-- comment --><iframe src="x" border="0" framespacing="0" allowfullscreen="true"></iframe>'
+                      '</div>'))
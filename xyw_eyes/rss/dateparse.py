@@ -0,0 +1,175 @@
+import re
+import datetime
+from typing import Union, Optional, Hashable, Callable, List, Tuple, Dict
+
+# 没有时区信息的时间默认所在的时区
+DEFAULT_TIMEZONE = datetime.timezone(datetime.timedelta(hours=8), 'CST')
+
+_EPOCH = re.compile(r'^\d{9,13}(\.\d+)?$')
+# email.utils导入较慢，第一次解析RFC 822格式时才导入
+_parsedate_to_datetime = None
+# xyw_eyes旧版本输出的时间格式，例如：Sat, 07 Sep 2002 00:00:01 GMT+0800 (CST)
+_LEGACY = re.compile(r'^(.*\d) GMT([+-]\d{4})(?: \(\w+\))?$')
+
+# 快速解析失败后依次尝试的strptime格式
+STRPTIME_FORMATS = (
+    '%Y/%m/%d %H:%M:%S',
+    '%Y/%m/%d %H:%M',
+    '%Y/%m/%d',
+    '%Y年%m月%d日 %H:%M:%S',
+    '%Y年%m月%d日 %H:%M',
+    '%Y年%m月%d日',
+)
+
+
+def _parse_epoch(text: str) -> datetime.datetime:
+    """
+    解析秒或毫秒级时间戳，返回UTC时间
+    """
+    if not _EPOCH.match(text):
+        raise ValueError('not an epoch timestamp')
+    value = float(text)
+    # 超过11位的视为毫秒级时间戳
+    if value >= 1e11:
+        value /= 1000
+    return datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
+
+
+def _parse_iso(text: str) -> datetime.datetime:
+    """
+    解析ISO 8601格式，包括YYYY-MM-DD HH:MM这类以空格分隔的格式
+    """
+    if text[-1:] in ('Z', 'z'):
+        text = text[:-1] + '+00:00'
+    return datetime.datetime.fromisoformat(text)
+
+
+def _parse_rfc822(text: str) -> datetime.datetime:
+    """
+    解析RFC 822格式，例如：Sat, 07 Sep 2002 00:00:01 GMT
+    """
+    global _parsedate_to_datetime
+    if _parsedate_to_datetime is None:
+        from email.utils import parsedate_to_datetime as _parsedate_to_datetime
+    match = _LEGACY.match(text)
+    if match:
+        text = '%s %s' % match.groups()
+    try:
+        result = _parsedate_to_datetime(text)
+    except (TypeError, IndexError) as e:
+        raise ValueError(str(e))
+    if result is None:
+        raise ValueError('not an RFC 822 date')
+    return result
+
+
+def _strptime(fmt: str) -> Callable[[str], datetime.datetime]:
+    def _parse(text: str) -> datetime.datetime:
+        return datetime.datetime.strptime(text, fmt)
+    return _parse
+
+
+class DateParser:
+    """
+    时间字符串解析器
+    依次尝试时间戳、ISO 8601、RFC 822以及常见的strptime格式，均失败时才使用较慢的dateutil
+    每个来源会记住上次解析成功的格式并优先尝试，同一来源的时间格式通常是固定的
+    """
+
+    def __init__(self, timezone: Optional[datetime.tzinfo] = None, fuzzy_fallback: bool = True):
+        """
+        :param timezone: 解析结果没有时区信息时附加的时区，为None时保持原样
+        :param fuzzy_fallback: 所有格式均失败时是否使用dateutil解析
+        """
+        self.timezone = timezone
+        self.fuzzy_fallback = fuzzy_fallback
+        self._paths: List[Tuple[str, Callable[[str], datetime.datetime]]] = [
+            ('epoch', _parse_epoch),
+            ('iso', _parse_iso),
+            ('rfc822', _parse_rfc822),
+        ] + [(fmt, _strptime(fmt)) for fmt in STRPTIME_FORMATS]
+        # 每个来源上次解析成功的格式在_paths中的位置，-1表示只能使用dateutil
+        self._formats: Dict[Hashable, int] = {}
+
+    def parse(self, value: Union[str, int, float], source: Hashable = None) -> datetime.datetime:
+        """
+        解析时间
+        :param value: 时间字符串或时间戳
+        :param source: 时间的来源，例如爬虫名称，用于缓存该来源的时间格式
+        :return:
+        """
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        text = value.strip()
+        cached = self._formats.get(source)
+        if cached is not None and cached >= 0:
+            try:
+                return self._localize(self._paths[cached][1](text))
+            except ValueError:
+                pass
+        for index, (_, func) in enumerate(self._paths):
+            if index == cached:
+                continue
+            try:
+                result = func(text)
+            except ValueError:
+                continue
+            self._formats[source] = index
+            return self._localize(result)
+        if not self.fuzzy_fallback:
+            raise ValueError('unknown date format: %r' % value)
+        from dateutil.parser import parse
+        result = parse(text)
+        self._formats[source] = -1
+        return self._localize(result)
+
+    def learned_format(self, source: Hashable = None) -> Optional[str]:
+        """
+        查看某个来源缓存的时间格式
+        :param source:
+        :return: 格式名称，使用dateutil时为'dateutil'，还没有解析过时为None
+        """
+        index = self._formats.get(source)
+        if index is None:
+            return None
+        return 'dateutil' if index < 0 else self._paths[index][0]
+
+    def _localize(self, result: datetime.datetime) -> datetime.datetime:
+        if self.timezone is not None and result.tzinfo is None:
+            return result.replace(tzinfo=self.timezone)
+        return result
+
+
+def to_timestamp(value: Union[datetime.datetime, int, float, None]) -> Optional[float]:
+    """
+    将时间转换为时间戳，没有时区信息的时间视为DEFAULT_TIMEZONE时区
+    :param value: datetime或时间戳
+    :return: value为None时返回None
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        if value.utcoffset() is None:
+            value = value.replace(tzinfo=DEFAULT_TIMEZONE)
+        return value.timestamp()
+    return float(value)
+
+
+def format_rfc822(dt: datetime.datetime) -> str:
+    """
+    将时间转换为RFC 822格式，没有时区信息的时间视为DEFAULT_TIMEZONE时区
+    :param dt:
+    :return: 例如：Sat, 07 Sep 2002 00:00:01 +0800
+    """
+    # 不能使用strftime，其输出与locale有关
+    if dt.utcoffset() is None:
+        dt = dt.replace(tzinfo=DEFAULT_TIMEZONE)
+    minutes = int(dt.utcoffset().total_seconds()) // 60
+    sign = '-' if minutes < 0 else '+'
+    minutes = abs(minutes)
+    return "%s, %02d %s %04d %02d:%02d:%02d %s%02d%02d" % (
+        ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"][dt.weekday()],
+        dt.day,
+        ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+         "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"][dt.month - 1],
+        dt.year, dt.hour, dt.minute, dt.second, sign, minutes // 60, minutes % 60)
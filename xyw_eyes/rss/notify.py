@@ -0,0 +1,483 @@
+import os
+import hmac
+import json
+import time
+import asyncio
+import hashlib
+import secrets
+from threading import Thread
+from typing import Optional, Dict, List, Iterable, Set, Tuple
+
+from aiohttp import web, ClientSession, ClientTimeout, ClientError
+from yarl import URL
+
+from xyw_eyes.rss.rss import Cloud, add_write_listener, remove_write_listener
+
+# rssCloud的订阅在25小时后过期，订阅者需要定期重新注册
+CLOUD_LEASE = 25 * 3600
+CLOUD_PATH = '/rsscloud/pleaseNotify'
+HUB_PATH = '/hub'
+
+
+def topic_url(path: str, root: str, base_url: str) -> Optional[str]:
+    """
+    根据xml文件路径计算订阅者使用的链接
+    :param path: xml文件路径
+    :param root: xml文件所在的目录，对应base_url
+    :param base_url: root目录的链接，例如https://example.com/xml/
+    :return: 文件不在root目录中时返回None
+    """
+    root = os.path.realpath(root)
+    path = os.path.realpath(path)
+    if not path.startswith(root + os.sep):
+        return None
+    relative = os.path.relpath(path, root).replace(os.sep, '/')
+    return base_url.rstrip('/') + '/' + relative
+
+
+async def _post_with_retry(session: ClientSession, url: str, retries: int, backoff: float, **kwargs) -> Optional[int]:
+    """
+    发送POST请求，网络错误或5xx时按指数退避重试
+    :return: 最后一次的状态码，全部因网络错误失败时返回None
+    """
+    status = None
+    for attempt in range(retries + 1):
+        if attempt:
+            await asyncio.sleep(backoff * 2 ** (attempt - 1))
+        try:
+            async with session.post(url, **kwargs) as resp:
+                status = resp.status
+                await resp.read()
+        except (ClientError, asyncio.TimeoutError):
+            status = None
+            continue
+        if status < 500 and status != 429:
+            return status
+    return status
+
+
+class FeedNotifier:
+    """
+    xml文件实际写入（内容有变化）后向WebSub hub发送publish通知，由hub把新内容推送给订阅者，订阅者不再需要按ttl轮询
+    通过add_write_listener接收写入通知，only_changed写入时内容没有变化不会触发通知
+    在事件循环中写入时通知作为该循环中的任务发送，需要在循环结束前await wait()；在循环之外写入时在新线程中发送
+    """
+
+    def __init__(self, hubs: Iterable[str], base_url: str, root: str = './xml', retries: int = 3,
+                 backoff: float = 1.0, timeout: float = 10, logger=None):
+        """
+        :param hubs: hub的链接列表，例如FeedHub的http://127.0.0.1:8081/hub
+        :param base_url: root目录的链接，与订阅者订阅时使用的链接一致
+        :param root: xml文件所在的目录，只通知该目录中的文件
+        :param retries: 网络错误或hub返回5xx时的重试次数
+        :param backoff: 第一次重试前的等待时间（秒），之后依次翻倍
+        :param timeout: 每次请求的超时时间（秒）
+        :param logger:
+        """
+        self.hubs = list(hubs)
+        self.base_url = base_url
+        self.root = root
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.logger = logger
+        self._tasks: Set[asyncio.Task] = set()
+        self._threads: List[Thread] = []
+        self.sent = 0
+        self.failed = 0
+        add_write_listener(self._on_write)
+
+    def _log(self, level: str, message: str) -> None:
+        if self.logger is not None:
+            getattr(self.logger, level)(message)
+
+    def _on_write(self, path: str, digest: str, obj) -> None:
+        topic = topic_url(path, self.root, self.base_url)
+        if topic is None or not self.hubs:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            task = loop.create_task(self.notify(topic))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            # 不是守护线程，进程退出前会等待通知发送完成
+            thread = Thread(target=asyncio.run, args=(self.notify(topic),))
+            thread.start()
+            self._threads.append(thread)
+
+    async def notify(self, topic: str) -> int:
+        """
+        通知所有hub该链接的内容已经更新
+        :param topic: 更新的xml文件的链接
+        :return: 成功通知的hub数
+        """
+        async with ClientSession(timeout=ClientTimeout(total=self.timeout)) as session:
+            results = await asyncio.gather(*(
+                _post_with_retry(session, hub, self.retries, self.backoff,
+                                 data={'hub.mode': 'publish', 'hub.url': topic})
+                for hub in self.hubs
+            ))
+        success = 0
+        for hub, status in zip(self.hubs, results):
+            if status is not None and 200 <= status < 300:
+                success += 1
+                self.sent += 1
+            else:
+                self.failed += 1
+                self._log('warning', '通知hub %s 失败，状态码 %s，更新的链接 %s' % (hub, status, topic))
+        if success:
+            self._log('info', '已通知 %d 个hub：%s 内容已更新' % (success, topic))
+        return success
+
+    async def wait(self) -> None:
+        """
+        等待当前事件循环中以及线程中的通知发送完成
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        tasks = [task for task in self._tasks if task.get_loop() is loop]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        threads, self._threads = self._threads, []
+        for thread in threads:
+            await loop.run_in_executor(None, thread.join)
+
+    def close(self) -> None:
+        """
+        停止接收写入通知
+        :return:
+        """
+        remove_write_listener(self._on_write)
+
+
+class Subscription:
+    """
+    一个订阅，kind为'websub'或'rsscloud'
+    """
+    __slots__ = ('kind', 'topic', 'callback', 'secret', 'expires')
+
+    def __init__(self, kind: str, topic: str, callback: str, expires: float, secret: Optional[str] = None):
+        self.kind = kind
+        self.topic = topic
+        self.callback = callback
+        self.expires = expires
+        self.secret = secret
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class FeedHub:
+    """
+    最小的本地推送服务，同时支持WebSub hub和rssCloud：
+    - WebSub：订阅者向/hub发送subscribe/unsubscribe，hub通过challenge验证回调后保存订阅；
+      收到publish通知后读取最新内容推送给该链接的订阅者，设置了secret时附带X-Hub-Signature
+    - rssCloud：订阅者向/rsscloud/pleaseNotify注册（只支持http-post），验证后保存25小时；
+      收到publish通知后向订阅者发送url参数
+    推送的并发数受concurrency限制，网络错误或5xx时按指数退避重试，订阅者返回410时删除订阅
+    """
+
+    def __init__(self,
+                 hub_url: Optional[str] = None,
+                 root: Optional[str] = None,
+                 base_url: Optional[str] = None,
+                 path: Optional[str] = None,
+                 concurrency: int = 16,
+                 retries: int = 3,
+                 backoff: float = 1.0,
+                 timeout: float = 10,
+                 lease_seconds: int = 10 * 24 * 3600,
+                 logger=None):
+        """
+        :param hub_url: hub对外的链接，推送时放在Link响应头中，为None时不发送rel="hub"
+        :param root: xml文件所在的目录，设置了base_url时直接从磁盘读取该目录中文件的内容，否则通过网络获取
+        :param base_url: root目录的链接
+        :param path: 保存订阅的json文件路径，为None时只保存在内存中
+        :param concurrency: 同时进行的推送数上限
+        :param retries: 推送失败时的重试次数
+        :param backoff: 第一次重试前的等待时间（秒），之后依次翻倍
+        :param timeout: 每次请求的超时时间（秒）
+        :param lease_seconds: WebSub订阅的最长有效时间（秒），订阅者没有指定时使用该值
+        :param logger:
+        """
+        if concurrency < 1:
+            raise ValueError('concurrency must be no less than 1')
+        self.hub_url = hub_url
+        self.root = root
+        self.base_url = base_url
+        self.path = path
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.lease_seconds = lease_seconds
+        self.logger = logger
+        # (kind, topic, callback)到订阅的映射
+        self.subscriptions: Dict[Tuple[str, str, str], Subscription] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session: Optional[ClientSession] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.delivered = 0
+        self.failed = 0
+        self._load()
+
+    def _log(self, level: str, message: str) -> None:
+        if self.logger is not None:
+            getattr(self.logger, level)(message)
+
+    def _load(self) -> None:
+        if self.path is None or not os.path.isfile(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as fp:
+            data = json.load(fp)
+        now = time.time()
+        for value in data:
+            subscription = Subscription(**value)
+            if subscription.expires > now:
+                self.subscriptions[(subscription.kind, subscription.topic, subscription.callback)] = subscription
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        data = [subscription.to_dict() for subscription in self.subscriptions.values()]
+        with open(self.path, 'w', encoding='utf-8') as fp:
+            json.dump(data, fp, ensure_ascii=False)
+
+    def _expire(self) -> None:
+        now = time.time()
+        expired = [key for key, subscription in self.subscriptions.items() if subscription.expires <= now]
+        for key in expired:
+            del self.subscriptions[key]
+        if expired:
+            self._save()
+
+    def subscribers(self, topic: str) -> List[Subscription]:
+        """
+        :param topic:
+        :return: 该链接当前有效的订阅
+        """
+        self._expire()
+        return [subscription for subscription in self.subscriptions.values() if subscription.topic == topic]
+
+    def cloud(self, domain: str, port: int) -> Cloud:
+        """
+        生成RSS2的cloud元素，订阅者据此向本服务注册rssCloud通知
+        :param domain: 本服务对外的域名
+        :param port: 本服务对外的端口
+        :return:
+        """
+        return Cloud(domain, port, CLOUD_PATH, '', 'http-post')
+
+    def _get_session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(timeout=ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _verify(self, mode: str, topic: str, callback: str, lease: int, secret: Optional[str]) -> bool:
+        challenge = secrets.token_urlsafe(24)
+        query = {'hub.mode': mode, 'hub.topic': topic, 'hub.challenge': challenge}
+        if mode == 'subscribe':
+            query['hub.lease_seconds'] = str(lease)
+        try:
+            async with self._get_session().get(URL(callback).update_query(query)) as resp:
+                body = await resp.text()
+                verified = 200 <= resp.status < 300 and body.strip() == challenge
+        except (ClientError, asyncio.TimeoutError, UnicodeDecodeError):
+            verified = False
+        key = ('websub', topic, callback)
+        if not verified:
+            self._log('warning', '订阅者 %s 没有确认对 %s 的%s' % (callback, topic, '订阅' if mode == 'subscribe' else '取消订阅'))
+            return False
+        if mode == 'subscribe':
+            self.subscriptions[key] = Subscription('websub', topic, callback, time.time() + lease, secret)
+            self._log('info', '订阅者 %s 订阅了 %s，有效期 %d 秒' % (callback, topic, lease))
+        elif self.subscriptions.pop(key, None) is not None:
+            self._log('info', '订阅者 %s 取消订阅 %s' % (callback, topic))
+        self._save()
+        return True
+
+    async def handle_hub(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        mode = data.get('hub.mode')
+        if mode == 'publish':
+            topic = data.get('hub.url') or data.get('hub.topic')
+            if not topic:
+                raise web.HTTPBadRequest(text='hub.url is required')
+            self._spawn(self.publish(topic))
+            return web.Response(status=202)
+        if mode not in ('subscribe', 'unsubscribe'):
+            raise web.HTTPBadRequest(text='unsupported hub.mode')
+        topic = data.get('hub.topic')
+        callback = data.get('hub.callback')
+        if not topic or not callback or URL(callback).scheme not in ('http', 'https'):
+            raise web.HTTPBadRequest(text='hub.topic and an http(s) hub.callback are required')
+        secret = data.get('hub.secret') or None
+        if secret is not None and len(secret.encode('utf-8')) >= 200:
+            raise web.HTTPBadRequest(text='hub.secret must be less than 200 bytes')
+        try:
+            lease = int(data.get('hub.lease_seconds') or self.lease_seconds)
+        except ValueError:
+            raise web.HTTPBadRequest(text='hub.lease_seconds must be integer')
+        lease = min(max(lease, 60), self.lease_seconds)
+        # 先返回202，再异步验证订阅者
+        self._spawn(self._verify(mode, topic, callback, lease, secret))
+        return web.Response(status=202)
+
+    @staticmethod
+    def _cloud_result(success: bool, message: str) -> web.Response:
+        return web.Response(
+            text='<?xml version="1.0"?>\n<notifyResult success="%s" msg="%s"/>'
+                 % ('true' if success else 'false', message),
+            content_type='text/xml'
+        )
+
+    async def handle_cloud(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        if data.get('protocol') != 'http-post':
+            return self._cloud_result(False, 'Only the http-post protocol is supported.')
+        topics = [value for key, value in data.items() if key.startswith('url') and value]
+        if not topics or not data.get('port') or not data.get('path'):
+            return self._cloud_result(False, 'port, path and url1 are required.')
+        domain = data.get('domain')
+        callback = 'http://%s:%s%s' % (domain or request.remote, data['port'], data['path'])
+        # 指定了domain时通过GET验证challenge，否则向请求来源发送一次测试通知
+        try:
+            if domain:
+                challenge = secrets.token_urlsafe(24)
+                async with self._get_session().get(callback, params={'url': topics[0], 'challenge': challenge}) as resp:
+                    verified = 200 <= resp.status < 300 and (await resp.text()).strip() == challenge
+            else:
+                async with self._get_session().post(callback, data={'url': topics[0]}) as resp:
+                    verified = 200 <= resp.status < 300
+        except (ClientError, asyncio.TimeoutError, UnicodeDecodeError):
+            verified = False
+        if not verified:
+            self._log('warning', 'rssCloud订阅者 %s 验证失败' % callback)
+            return self._cloud_result(False, 'The subscriber could not be verified.')
+        expires = time.time() + CLOUD_LEASE
+        for topic in topics:
+            self.subscriptions[('rsscloud', topic, callback)] = Subscription('rsscloud', topic, callback, expires)
+        self._save()
+        self._log('info', 'rssCloud订阅者 %s 注册了 %d 个链接' % (callback, len(topics)))
+        return self._cloud_result(True, 'Thanks for the registration. It will expire in 25 hours.')
+
+    async def _content(self, topic: str) -> Optional[Tuple[bytes, str]]:
+        """
+        获取链接的最新内容
+        :param topic:
+        :return: (内容, Content-Type)，获取失败时返回None
+        """
+        if self.root is not None and self.base_url is not None \
+                and topic.startswith(self.base_url.rstrip('/') + '/'):
+            path = os.path.realpath(os.path.join(self.root, topic[len(self.base_url.rstrip('/')) + 1:]))
+            if path.startswith(os.path.realpath(self.root) + os.sep) and os.path.isfile(path):
+                with open(path, 'rb') as fp:
+                    return fp.read(), 'application/rss+xml; charset=utf-8'
+        try:
+            async with self._get_session().get(topic) as resp:
+                if resp.status != 200:
+                    return None
+                return await resp.read(), resp.headers.get('Content-Type', 'application/rss+xml')
+        except (ClientError, asyncio.TimeoutError):
+            return None
+
+    async def _deliver(self, subscription: Subscription, content: Optional[Tuple[bytes, str]]) -> bool:
+        if subscription.kind == 'rsscloud':
+            kwargs = {'data': {'url': subscription.topic}}
+        else:
+            body, content_type = content
+            links = ['<%s>; rel="self"' % subscription.topic]
+            if self.hub_url is not None:
+                links.insert(0, '<%s>; rel="hub"' % self.hub_url)
+            headers = {'Content-Type': content_type, 'Link': ', '.join(links)}
+            if subscription.secret:
+                headers['X-Hub-Signature'] = 'sha256=' + hmac.new(
+                    subscription.secret.encode('utf-8'), body, hashlib.sha256
+                ).hexdigest()
+            kwargs = {'data': body, 'headers': headers}
+        async with self._semaphore:
+            status = await _post_with_retry(self._get_session(), subscription.callback, self.retries,
+                                            self.backoff, **kwargs)
+        if status == 410:
+            # 订阅者已经不再需要该订阅
+            self.subscriptions.pop((subscription.kind, subscription.topic, subscription.callback), None)
+            self._save()
+            self._log('info', '订阅者 %s 返回410，已删除对 %s 的订阅' % (subscription.callback, subscription.topic))
+            return False
+        if status is not None and 200 <= status < 300:
+            self.delivered += 1
+            return True
+        self.failed += 1
+        self._log('warning', '向订阅者 %s 推送 %s 失败，状态码 %s' % (subscription.callback, subscription.topic, status))
+        return False
+
+    async def publish(self, topic: str) -> int:
+        """
+        将链接的最新内容推送给所有订阅者
+        :param topic:
+        :return: 推送成功的订阅者数
+        """
+        subscriptions = self.subscribers(topic)
+        if not subscriptions:
+            return 0
+        self._get_session()
+        content = None
+        if any(subscription.kind == 'websub' for subscription in subscriptions):
+            content = await self._content(topic)
+            if content is None:
+                self._log('warning', '无法获取 %s 的内容，只通知rssCloud订阅者' % topic)
+                subscriptions = [subscription for subscription in subscriptions if subscription.kind == 'rsscloud']
+        results = await asyncio.gather(*(self._deliver(subscription, content) for subscription in subscriptions))
+        self._log('info', '%s 已更新，推送给 %d 个订阅者，成功 %d 个' % (topic, len(results), sum(results)))
+        return sum(results)
+
+    async def close(self) -> None:
+        """
+        取消进行中的验证和推送，关闭连接
+        :return:
+        """
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def app(self) -> web.Application:
+        """
+        创建aiohttp应用，可以与FeedPublisher的应用挂载到同一个服务中
+        :return:
+        """
+        application = web.Application()
+        application.router.add_post(HUB_PATH, self.handle_hub)
+        application.router.add_post(CLOUD_PATH, self.handle_cloud)
+
+        async def cleanup(_):
+            await self.close()
+
+        application.on_cleanup.append(cleanup)
+        return application
+
+    def run(self, host: str = '0.0.0.0', port: int = 8081) -> None:
+        """
+        启动推送服务
+        :param host:
+        :param port:
+        :return:
+        """
+        web.run_app(self.app(), host=host, port=port)
+
+
+if __name__ == '__main__':
+    FeedHub(root='./xml', base_url='http://127.0.0.1:8080/', path='./xml/subscriptions.json').run(port=8081)
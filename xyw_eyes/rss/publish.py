@@ -0,0 +1,260 @@
+import os
+import re
+import gzip
+import time
+import asyncio
+import hashlib
+import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Dict, List, Tuple
+
+from aiohttp import web
+
+from xyw_eyes.rss.rss import add_write_listener, remove_write_listener
+
+try:
+    # 可选依赖，安装后额外提供brotli压缩的版本
+    import brotli
+except ImportError:
+    brotli = None
+
+_TTL = re.compile(r'<ttl>\s*(\d+)\s*</ttl>')
+_SKIP_HOURS = re.compile(r'<skipHours>(.*?)</skipHours>', re.S)
+_SKIP_DAYS = re.compile(r'<skipDays>(.*?)</skipDays>', re.S)
+_HOUR = re.compile(r'<hour>\s*(\d+)\s*</hour>')
+_DAY = re.compile(r'<day>\s*(\w+)\s*</day>')
+_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class FeedEntry:
+    """
+    内存中缓存的一个RSS文件，ETag、Last-Modified以及压缩版本在每次文件写入后只计算一次
+    """
+
+    def __init__(self, path: str):
+        stat = os.stat(path)
+        with open(path, 'rb') as fp:
+            body = fp.read()
+        self.path = path
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.checked = time.monotonic()
+        self.mtime = int(stat.st_mtime)
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        tag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        # 不同编码的内容不同，强ETag也必须不同
+        self.variants: Dict[Optional[str], Tuple[bytes, str]] = {None: (body, '"%s"' % tag)}
+        self.variants['gzip'] = (gzip.compress(body, 9), '"%s-gzip"' % tag)
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body), '"%s-br"' % tag)
+        self.etags = {etag for _, etag in self.variants.values()}
+
+        # channel中的ttl、skipHours以及skipDays，只在第一个item之前查找
+        head = body[:body.find(b'<item')] if b'<item' in body else body
+        head = head.decode('utf-8', 'ignore')
+        match = _TTL.search(head)
+        self.ttl: Optional[int] = int(match.group(1)) if match else None
+        match = _SKIP_HOURS.search(head)
+        self.skip_hours = {int(hour) for hour in _HOUR.findall(match.group(1))} if match else set()
+        match = _SKIP_DAYS.search(head)
+        self.skip_days = {day.capitalize() for day in _DAY.findall(match.group(1))} if match else set()
+
+    def changed(self) -> bool:
+        """
+        检查磁盘上的文件是否已经被修改
+        :return:
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return True
+        return (stat.st_mtime_ns, stat.st_size) != self.signature
+
+    def max_age(self, default_ttl: int, now: Optional[float] = None) -> int:
+        """
+        根据ttl、skipHours以及skipDays计算Cache-Control中的max-age
+        处于skipHours或skipDays（均为GMT时间）中时，max-age延长到跳过的时段结束
+        :param default_ttl: 文件中没有ttl时使用的值，单位分钟
+        :param now:
+        :return: 秒数
+        """
+        max_age = (self.ttl if self.ttl is not None else default_ttl) * 60
+        if not self.skip_hours and not self.skip_days:
+            return max_age
+        start = datetime.datetime.fromtimestamp(now if now is not None else time.time(), datetime.timezone.utc)
+        moment = start
+        # 最多向后检查一周
+        for _ in range(24 * 7):
+            if moment.hour not in self.skip_hours and _DAYS[moment.weekday()] not in self.skip_days:
+                break
+            moment = moment.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+        return max(max_age, int((moment - start).total_seconds()))
+
+
+class FeedPublisher:
+    """
+    RSS文件发布服务，从内存缓存中提供root目录下的xml文件
+    同一进程中通过WriteXmlMixin写入文件时立即刷新缓存，其他进程写入时通过定期检查文件状态刷新
+    支持If-None-Match/If-Modified-Since条件请求、gzip/brotli预压缩以及根据ttl等属性生成的Cache-Control
+    """
+
+    content_type = 'application/rss+xml; charset=utf-8'
+
+    def __init__(self, root: str = './xml', check_interval: float = 1.0, default_ttl: int = 60,
+                 hub_url: Optional[str] = None):
+        """
+        :param root: xml文件所在的目录
+        :param check_interval: 两次检查文件是否被其他进程修改之间的最小间隔，单位秒
+        :param default_ttl: 文件中没有ttl时Cache-Control使用的缓存时间，单位分钟
+        :param hub_url: WebSub hub的链接，设置后响应中包含Link头，订阅者据此向hub订阅而不是轮询
+        """
+        self.root = os.path.realpath(root)
+        self.check_interval = check_interval
+        self.default_ttl = default_ttl
+        self.hub_url = hub_url
+        self._entries: Dict[str, FeedEntry] = {}
+        add_write_listener(self._on_write)
+
+    def _on_write(self, path: str, digest: str, obj) -> None:
+        self._entries.pop(os.path.realpath(path), None)
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """
+        清除缓存
+        :param path: 需要清除的文件路径，为None时清除全部缓存
+        :return:
+        """
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(os.path.realpath(path), None)
+
+    def close(self) -> None:
+        """
+        停止接收写入通知并清除缓存
+        :return:
+        """
+        remove_write_listener(self._on_write)
+        self._entries.clear()
+
+    def _resolve(self, name: str) -> Optional[str]:
+        path = os.path.realpath(os.path.join(self.root, name))
+        # 禁止访问root目录之外的文件
+        if not path.startswith(self.root + os.sep) or not path.endswith('.xml'):
+            return None
+        return path
+
+    async def get_entry(self, name: str) -> Optional[FeedEntry]:
+        """
+        获取文件的缓存，缓存不存在或文件已被修改时重新读取
+        :param name: 相对于root的文件路径
+        :return: 文件不存在时返回None
+        """
+        path = self._resolve(name)
+        if path is None:
+            return None
+        entry = self._entries.get(path)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked < self.check_interval:
+            return entry
+        if entry is not None and not entry.changed():
+            entry.checked = now
+            return entry
+        if not os.path.isfile(path):
+            self._entries.pop(path, None)
+            return None
+        # 读取和压缩较大的文件比较耗时，放到线程池中进行
+        entry = await asyncio.get_running_loop().run_in_executor(None, FeedEntry, path)
+        self._entries[path] = entry
+        return entry
+
+    @staticmethod
+    def _accepted_encodings(header: str) -> List[str]:
+        encodings = []
+        for part in header.split(','):
+            fields = part.strip().split(';')
+            coding = fields[0].strip().lower()
+            quality = 1.0
+            for field in fields[1:]:
+                field = field.strip()
+                if field.startswith('q='):
+                    try:
+                        quality = float(field[2:])
+                    except ValueError:
+                        quality = 0
+            if coding and quality > 0:
+                encodings.append(coding)
+        return encodings
+
+    def _choose_encoding(self, entry: FeedEntry, header: str) -> Optional[str]:
+        accepted = self._accepted_encodings(header)
+        for coding in ('br', 'gzip'):
+            if coding in entry.variants and (coding in accepted or '*' in accepted):
+                return coding
+        return None
+
+    @staticmethod
+    def _etag_matches(header: str, entry: FeedEntry) -> bool:
+        # If-None-Match使用弱比较
+        for tag in header.split(','):
+            tag = tag.strip()
+            if tag == '*':
+                return True
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag in entry.etags:
+                return True
+        return False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        entry = await self.get_entry(request.match_info['name'])
+        if entry is None:
+            raise web.HTTPNotFound()
+        encoding = self._choose_encoding(entry, request.headers.get('Accept-Encoding', ''))
+        body, etag = entry.variants[encoding]
+        headers = {
+            'ETag': etag,
+            'Last-Modified': entry.last_modified,
+            'Cache-Control': 'public, max-age=%d' % entry.max_age(self.default_ttl),
+            'Vary': 'Accept-Encoding',
+        }
+        if self.hub_url is not None:
+            headers['Link'] = '<%s>; rel="hub", <%s>; rel="self"' % (self.hub_url, request.url)
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            if self._etag_matches(if_none_match, entry):
+                return web.Response(status=304, headers=headers)
+        elif request.headers.get('If-Modified-Since'):
+            try:
+                since = parsedate_to_datetime(request.headers['If-Modified-Since']).timestamp()
+            except (TypeError, ValueError, IndexError):
+                since = None
+            if since is not None and entry.mtime <= since:
+                return web.Response(status=304, headers=headers)
+
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        headers['Content-Type'] = self.content_type
+        return web.Response(body=body, headers=headers)
+
+    def app(self) -> web.Application:
+        """
+        创建aiohttp应用，可以挂载到已有的应用中
+        :return:
+        """
+        application = web.Application()
+        application.router.add_get('/{name:.+\\.xml}', self.handle)
+        return application
+
+    def run(self, host: str = '0.0.0.0', port: int = 8080) -> None:
+        """
+        启动发布服务
+        :param host:
+        :param port:
+        :return:
+        """
+        web.run_app(self.app(), host=host, port=port)
+
+
+if __name__ == '__main__':
+    FeedPublisher('./xml').run(port=8080)
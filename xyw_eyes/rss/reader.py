@@ -0,0 +1,217 @@
+import io
+import os
+from typing import Union, Optional, Container, Iterator, Hashable, BinaryIO
+
+from xyw_eyes.rss.rss import RSSItem, Guid, Enclosure, Category, Source, parse_string_to_datetime
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+RSS1_NS = 'http://purl.org/rss/1.0/'
+CONTENT_NS = 'http://purl.org/rss/1.0/modules/content/'
+DC_NS = 'http://purl.org/dc/elements/1.1/'
+
+# iterparse只对这些元素产生事件，RSS 2.0的item没有命名空间
+_ITEM_TAGS = ('item', '{%s}item' % RSS1_NS, '{%s}entry' % ATOM_NS)
+
+
+def _local_name(tag) -> str:
+    if not isinstance(tag, str):
+        # 注释、处理指令等
+        return ''
+    return tag.rsplit('}', 1)[-1]
+
+
+def _text(element) -> Optional[str]:
+    if element is None or element.text is None:
+        return None
+    text = element.text.strip()
+    return text or None
+
+
+def _atom_content(element) -> Optional[str]:
+    """
+    Atom的summary、content元素，type为xhtml时内容是子元素，需要序列化
+    """
+    if element is None:
+        return None
+    if element.get('type') == 'xhtml':
+        from lxml import etree
+        parts = [element.text or '']
+        parts.extend(etree.tostring(child, encoding='unicode') for child in element)
+        return ''.join(parts).strip() or None
+    return _text(element)
+
+
+def _parse_date(text: Optional[str], source: Hashable) -> Optional[object]:
+    if text is None:
+        return None
+    try:
+        return parse_string_to_datetime(text, source)
+    except (ValueError, OverflowError):
+        return None
+
+
+def item_key(item: RSSItem) -> Optional[str]:
+    """
+    用于去重的item标识，优先使用guid，没有guid时使用link
+    :param item:
+    :return:
+    """
+    guid = item.guid
+    if isinstance(guid, Guid):
+        guid = guid.guid
+    return guid or item.link
+
+
+def _rss_item(element, source: Hashable) -> RSSItem:
+    fields = {}
+    categories = []
+    for child in element:
+        name = _local_name(child.tag)
+        namespace = child.tag[1:].split('}', 1)[0] if child.tag[:1] == '{' else None
+        if namespace == CONTENT_NS:
+            if name == 'encoded':
+                fields['encoded'] = _text(child)
+            continue
+        if namespace == DC_NS:
+            if name in ('date', 'creator'):
+                fields['dc_' + name] = _text(child)
+            continue
+        if name == 'category':
+            text = _text(child)
+            if text is not None:
+                categories.append(Category(text, child.get('domain')))
+        elif name == 'guid':
+            text = _text(child)
+            if text is not None:
+                fields['guid'] = Guid(text, child.get('isPermaLink', 'true').strip().lower() != 'false')
+        elif name == 'enclosure':
+            if child.get('url'):
+                length = child.get('length', '0').strip()
+                fields['enclosure'] = Enclosure(child.get('url'), int(length) if length.isdigit() else 0,
+                                                child.get('type', ''))
+        elif name == 'source':
+            fields['source'] = Source(_text(child), child.get('url'))
+        elif name in ('title', 'link', 'description', 'author', 'comments', 'pubDate'):
+            fields[name] = _text(child)
+    link = fields.get('link')
+    if link is None and element.get('{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about'):
+        # RSS 1.0的item在rdf:about中给出链接
+        link = element.get('{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about')
+    title = fields.get('title')
+    description = fields.get('description') or fields.get('encoded')
+    return RSSItem(
+        title=title if title is not None or description is not None else '',
+        link=link,
+        description=description,
+        author=fields.get('author') or fields.get('dc_creator'),
+        categories=categories,
+        comments=fields.get('comments'),
+        enclosure=fields.get('enclosure'),
+        guid=fields.get('guid'),
+        pubDate=_parse_date(fields.get('pubDate') or fields.get('dc_date'), source),
+        source=fields.get('source'),
+    )
+
+
+def _atom_entry(element, source: Hashable) -> RSSItem:
+    fields = {}
+    categories = []
+    for child in element:
+        if child.tag[:len(ATOM_NS) + 2] != '{%s}' % ATOM_NS:
+            continue
+        name = _local_name(child.tag)
+        if name == 'link':
+            rel = child.get('rel', 'alternate')
+            if rel == 'alternate' and 'link' not in fields:
+                fields['link'] = child.get('href')
+            elif rel == 'enclosure' and child.get('href'):
+                length = child.get('length', '0').strip()
+                fields['enclosure'] = Enclosure(child.get('href'), int(length) if length.isdigit() else 0,
+                                                child.get('type', ''))
+        elif name == 'category':
+            if child.get('term'):
+                categories.append(Category(child.get('term'), child.get('scheme')))
+        elif name == 'author':
+            fields['author'] = _text(child.find('{%s}name' % ATOM_NS)) or _text(child.find('{%s}email' % ATOM_NS))
+        elif name in ('summary', 'content'):
+            fields[name] = _atom_content(child)
+        elif name in ('title', 'id', 'published', 'updated'):
+            fields[name] = _text(child)
+    title = fields.get('title')
+    description = fields.get('content') or fields.get('summary')
+    return RSSItem(
+        title=title if title is not None or description is not None else '',
+        link=fields.get('link'),
+        description=description,
+        author=fields.get('author'),
+        categories=categories,
+        enclosure=fields.get('enclosure'),
+        # Atom的id是IRI，不一定能直接访问，因此不视为永久链接
+        guid=Guid(fields['id'], isPermaLink=False) if fields.get('id') else None,
+        pubDate=_parse_date(fields.get('published') or fields.get('updated'), source),
+    )
+
+
+def read_feed(feed: Union[bytes, str, BinaryIO],
+              seen: Optional[Container[str]] = None,
+              stop_at_seen: bool = True,
+              limit: Optional[int] = None,
+              source: Hashable = None) -> Iterator[RSSItem]:
+    """
+    流式读取RSS 2.0、RSS 1.0或Atom订阅源，依次生成RSSItem
+    使用lxml的iterparse边解析边清理已处理的元素，内存占用与订阅源大小无关
+    订阅源通常按时间倒序排列，遇到已经见过的item时可以停止解析，只处理开头新增的部分
+    :param feed: 订阅源的字节、文件路径或以二进制模式打开的文件
+    :param seen: 已经见过的item标识（见item_key），例如上次抓取时保存的guid集合
+    :param stop_at_seen: 为True时遇到第一个见过的item即停止，为False时跳过见过的item继续解析
+    :param limit: 最多生成的item数量
+    :param source: 订阅源名称，用于缓存该来源的时间格式
+    :return:
+    """
+    from lxml import etree
+    if isinstance(feed, (bytes, bytearray, memoryview)):
+        feed = io.BytesIO(feed)
+    elif isinstance(feed, str) and not os.path.isfile(feed):
+        raise ValueError('file "{}" does not exists'.format(feed))
+    if source is None and isinstance(feed, str):
+        source = feed
+
+    # item中的注释和处理指令的tag不是字符串，解析时直接丢弃
+    context = etree.iterparse(feed, events=('end',), tag=_ITEM_TAGS, remove_comments=True, remove_pis=True,
+                              resolve_entities=False, no_network=True, huge_tree=True)
+    count = 0
+    try:
+        for _, element in context:
+            if element.tag == _ITEM_TAGS[2]:
+                item = _atom_entry(element, source)
+            else:
+                item = _rss_item(element, source)
+            # 清理当前元素以及之前已经处理过的兄弟元素
+            element.clear(keep_tail=False)
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+
+            if seen is not None and item_key(item) in seen:
+                if stop_at_seen:
+                    return
+                continue
+            yield item
+            count += 1
+            if limit is not None and count >= limit:
+                return
+    finally:
+        del context
+
+
+if __name__ == '__main__':
+    data = b'''<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>t</title>
+<item><title>3</title><link>https://example.com/3</link><guid>https://example.com/3</guid>
+<pubDate>Sat, 03 Jul 2021 20:00:00 +0800</pubDate></item>
+<item><title>2</title><link>https://example.com/2</link><guid>https://example.com/2</guid></item>
+<item><title>1</title><link>https://example.com/1</link><guid>https://example.com/1</guid></item>
+</channel></rss>'''
+    for rss_item in read_feed(data, seen={'https://example.com/2'}):
+        print(rss_item.title, rss_item.link, rss_item.pubDate)
@@ -1,12 +1,92 @@
 import os
-import aiofiles
+import hashlib
 import datetime
 from io import StringIO
-from dateutil.parser import parse
+from typing import Union, Hashable, Optional, Tuple, Dict, List, Callable
+
+from xyw_eyes.rss.dateparse import DateParser, format_rfc822
+
+# 进程内缓存的已写入文件的内容摘要，键为文件的绝对路径，避免每次都读取摘要文件
+_digests: Dict[str, str] = {}
+# 实际写入xml文件后调用的回调函数，参数为(文件路径, 内容摘要, 写入的对象)
+_write_listeners: List[Callable] = []
+
+
+def add_write_listener(callback: Callable) -> None:
+    """
+    注册写入xml文件后的回调函数，只在文件实际被写入时调用，例如用于刷新缓存或通知订阅者
+    :param callback: 参数为(文件路径, 内容摘要, 写入的对象)
+    :return:
+    """
+    if callback not in _write_listeners:
+        _write_listeners.append(callback)
+
+
+def remove_write_listener(callback: Callable) -> None:
+    """
+    取消注册写入xml文件后的回调函数
+    :param callback:
+    :return:
+    """
+    if callback in _write_listeners:
+        _write_listeners.remove(callback)
+
+
+def _written(path: str, digest: str, obj) -> None:
+    _digests[os.path.abspath(path)] = digest
+    for callback in list(_write_listeners):
+        callback(path, digest, obj)
+
+
+def content_digest(xml: str, exclude: Optional[str] = None) -> str:
+    """
+    计算xml内容的摘要
+    :param xml:
+    :param exclude: 计算时忽略的元素名称，只忽略第一次出现的该元素
+    :return:
+    """
+    if exclude is not None:
+        start = xml.find('<%s>' % exclude)
+        if start >= 0:
+            end_tag = '</%s>' % exclude
+            end = xml.find(end_tag, start)
+            if end >= 0:
+                xml = xml[:start] + xml[end + len(end_tag):]
+    return hashlib.blake2b(xml.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def digest_path(path: str) -> str:
+    """
+    xml文件对应的摘要文件路径
+    :param path:
+    :return:
+    """
+    return path + '.digest'
+
+
+def stored_digest(path: str) -> Optional[str]:
+    """
+    读取上次写入xml文件时保存的内容摘要
+    :param path: xml文件路径
+    :return: 没有写入过时返回None
+    """
+    key = os.path.abspath(path)
+    if key not in _digests:
+        try:
+            with open(digest_path(path), 'r') as fp:
+                _digests[key] = fp.read().strip()
+        except OSError:
+            return None
+    return _digests[key]
 
 
 # Could make this the base class; will need to add 'publish'
 class WriteXmlMixin:
+    # 不占用实例空间，使带__slots__的子类不会再生成__dict__
+    __slots__ = ()
+    # 记录生成时间的属性名，该属性对应的元素不参与内容摘要的计算，内容有变化时自动更新为当前时间
+    build_date_attr = None
+
     def write_xml(self, outfile, encoding="utf-8"):
         from xml.sax import saxutils
         handler = saxutils.XMLGenerator(outfile, encoding)
@@ -19,16 +99,49 @@ class WriteXmlMixin:
         self.write_xml(f, encoding)
         return f.getvalue()
 
-    async def async_write(self, path: str, encoding: str = 'utf-8') -> None:
+    def _render(self, path: str, encoding: str, only_changed: bool) -> Optional[Tuple[str, str]]:
+        """
+        生成xml及其内容摘要，only_changed为True时与上次写入的内容摘要比较
+        :param path:
+        :param encoding:
+        :param only_changed:
+        :return: 需要写入时返回(xml, 摘要)，内容没有变化时返回None
+        """
+        old = None
+        if only_changed and self.build_date_attr is not None:
+            old = getattr(self, self.build_date_attr)
+            setattr(self, self.build_date_attr, datetime.datetime.now().astimezone())
+        xml = self.to_xml(encoding)
+        digest = content_digest(xml, self.build_date_attr)
+        if only_changed and digest == stored_digest(path) and os.path.exists(path):
+            # 内容没有变化，恢复原来的生成时间
+            if self.build_date_attr is not None:
+                setattr(self, self.build_date_attr, old)
+            return None
+        return xml, digest
+
+    async def async_write(self, path: str, encoding: str = 'utf-8', only_changed: bool = False) -> bool:
         """
         异步写入数据到xml文件
         :param path: 文件路径
         :param encoding: 文件编码方式
-        :return:
+        :param only_changed: 为True时，除生成时间外内容与上次写入相同则不写入文件，也不更新生成时间，
+                             内容有变化时自动将生成时间更新为当前时间
+        :return: 是否实际写入了文件
         """
+        # 只在异步写入时才需要aiofiles，延迟导入以加快启动
+        import aiofiles
+        rendered = self._render(path, encoding, only_changed)
+        if rendered is None:
+            return False
+        xml, digest = rendered
         self.check_path(path)
         async with aiofiles.open(path, 'w', encoding=encoding) as fp:
-            await fp.write(self.to_xml(encoding))
+            await fp.write(xml)
+        async with aiofiles.open(digest_path(path), 'w') as fp:
+            await fp.write(digest)
+        _written(path, digest, self)
+        return True
 
     @staticmethod
     def check_path(path: str) -> None:
@@ -41,15 +154,26 @@ class WriteXmlMixin:
         if not os.path.exists(dir_path):
             os.makedirs(dir_path)
 
-    def write(self, path: str, encoding: str = 'utf-8'):
+    def write(self, path: str, encoding: str = 'utf-8', only_changed: bool = False) -> bool:
         """
         根据文件路径写入数据到xml文件
         :param path: 文件路径
         :param encoding: 文件编码方式
-        :return:
+        :param only_changed: 为True时，除生成时间外内容与上次写入相同则不写入文件，也不更新生成时间，
+                             内容有变化时自动将生成时间更新为当前时间
+        :return: 是否实际写入了文件
         """
+        rendered = self._render(path, encoding, only_changed)
+        if rendered is None:
+            return False
+        xml, digest = rendered
         self.check_path(path)
-        self.write_xml(open(path, 'w', encoding=encoding), encoding=encoding)
+        with open(path, 'w', encoding=encoding) as fp:
+            fp.write(xml)
+        with open(digest_path(path), 'w') as fp:
+            fp.write(digest)
+        _written(path, digest, self)
+        return True
 
 
 def _element(handler, name, obj, d=None):
@@ -79,21 +203,12 @@ def _opt_element(handler, name, obj):
 def _format_date(dt):
     """convert a datetime into an RFC 822 formatted date
 
-    Input date must be in GMT.
+    Timezone-aware datetimes keep their own offset; naive ones are
+    taken to be in DEFAULT_TIMEZONE (UTC+8).
     """
     # Looks like:
-    #   Sat, 07 Sep 2002 00:00:01 GMT
-    # Can't use strftime because that's locale dependent
-    #
-    # Isn't there a standard way to do this for Python?  The
-    # rfc822 and email.Utils modules assume a timestamp.  The
-    # following is based on the rfc822 module.
-    return "%s, %02d %s %04d %02d:%02d:%02d GMT+0800 (CST)" % (
-        ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"][dt.weekday()],
-        dt.day,
-        ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
-         "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"][dt.month - 1],
-        dt.year, dt.hour, dt.minute, dt.second)
+    #   Sat, 07 Sep 2002 00:00:01 +0800
+    return format_rfc822(dt)
 
 
 ##
@@ -139,6 +254,7 @@ class DateElement:
 
 class Category:
     """Publish a category element"""
+    __slots__ = ('category', 'domain')
 
     def __init__(self, category, domain=None):
         self.category = category
@@ -212,6 +328,7 @@ class Guid:
     Defaults to being a permalink, which is the assumption if it's
     omitted.  Hence strings are always permalinks.
     """
+    __slots__ = ('guid', 'isPermaLink')
 
     def __init__(self, guid, isPermaLink=1):
         self.guid = guid
@@ -250,6 +367,7 @@ class TextInput:
 
 class Enclosure:
     """Publish an enclosure"""
+    __slots__ = ('url', 'length', 'type')
 
     def __init__(self, url, length, type):
         self.url = url
@@ -266,6 +384,7 @@ class Enclosure:
 
 class Source:
     """Publish the item's original source, used by aggregators"""
+    __slots__ = ('name', 'url')
 
     def __init__(self, name, url):
         self.name = name
@@ -320,6 +439,7 @@ class RSS2(WriteXmlMixin):
 
     rss_attrs = {"version": "2.0"}
     element_attrs = {}
+    build_date_attr = 'lastBuildDate'
 
     def __init__(self,
                  title,
@@ -438,11 +558,18 @@ class RSS2(WriteXmlMixin):
         pass
 
     def set_build_time_now(self):
-        self.lastBuildDate = datetime.datetime.now()
+        # 带上本地时区，避免服务器不在东八区时时间错误
+        self.lastBuildDate = datetime.datetime.now().astimezone()
 
 
 class RSSItem(WriteXmlMixin):
-    """Publish an RSS Item"""
+    """Publish an RSS Item
+
+    Uses __slots__ to keep per-item overhead low for large feeds;
+    subclasses that need extra attributes get a __dict__ as usual.
+    """
+    __slots__ = ('title', 'link', 'description', 'author', 'categories', 'comments', 'enclosure', 'guid',
+                 'pubDate', 'source')
     element_attrs = {}
 
     def __init__(self,
@@ -521,9 +648,17 @@ def div(content: str) -> str:
     return '<div>{}</div>'.format(content)
 
 
-def parse_string_to_datetime(date_str: str) -> datetime.datetime:
-    # return parse(date_str) - datetime.timedelta(hours=8)
-    return parse(date_str)
+_date_parser = DateParser()
+
+
+def parse_string_to_datetime(date_str: Union[str, int, float], source: Hashable = None) -> datetime.datetime:
+    """
+    解析时间字符串，常见格式走快速路径，并按来源缓存解析成功的格式，均失败时才使用dateutil
+    :param date_str: 时间字符串或秒、毫秒级时间戳
+    :param source: 时间的来源，例如爬虫名称
+    :return: 字符串中不含时区信息时返回不带时区的时间，时间戳返回UTC时间
+    """
+    return _date_parser.parse(date_str, source)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,222 @@
+import os
+import time
+import pickle
+import sqlite3
+import datetime
+import threading
+from typing import Iterable, List, Optional, Union
+
+from xyw_eyes.rss.rss import RSS2, RSSItem
+from xyw_eyes.rss.dateparse import to_timestamp
+from xyw_eyes.rss.reader import item_key
+
+
+class ItemStore:
+    """
+    跨多次运行保存RSSItem的存储，基于SQLite，按(订阅源, guid)去重，按发布时间建立索引
+    每次运行只需写入本次抓取到的item，再从存储中生成包含历史item的RSS文件，不需要加载全部历史数据
+    用法：在item_pipeline中调用put，在end中调用flush后通过materialize生成RSS2
+    """
+
+    def __init__(self, path: str, feed: str = '', batch_size: int = 100, timeout: float = 30):
+        """
+        :param path: 数据库文件路径，多个订阅源可以共用同一个文件
+        :param feed: 默认的订阅源名称，例如爬虫名称
+        :param batch_size: put缓存的item达到该数量时自动写入
+        :param timeout: 等待数据库锁的最长时间，单位秒
+        """
+        dir_path = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+        self.path = path
+        self.feed = feed
+        self.batch_size = batch_size
+        # item_pipeline运行在协程子线程中，end运行在主线程中，因此允许跨线程使用并自行加锁
+        self._lock = threading.Lock()
+        self._buffer: List[RSSItem] = []
+        # 创建以来所有flush中新加入的item
+        self.new_items: List[RSSItem] = []
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS items (
+                feed TEXT NOT NULL,
+                guid TEXT NOT NULL,
+                date REAL NOT NULL,
+                added REAL NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (feed, guid)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS items_date ON items (feed, date DESC);
+        ''')
+
+    def _transaction(self, func, *args):
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(cursor, *args)
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+            return result
+
+    def add(self, items: Iterable[RSSItem], feed: Optional[str] = None, update: bool = False) -> List[RSSItem]:
+        """
+        立即写入一批item，没有guid和link的item无法去重，会被忽略
+        :param items:
+        :param feed: 订阅源名称，为None时使用默认值
+        :param update: 为True时用新数据覆盖已经存在的item，保留其首次加入的时间
+        :return: 之前不存在的item
+        """
+        feed = self.feed if feed is None else feed
+        now = time.time()
+        rows = []
+        for item in items:
+            key = item_key(item)
+            if key is None:
+                continue
+            date = to_timestamp(item.pubDate)
+            rows.append((item, key, date if date is not None else now, pickle.dumps(item, pickle.HIGHEST_PROTOCOL)))
+
+        def _add(cursor):
+            new = []
+            for item, key, date, payload in rows:
+                cursor.execute(
+                    'INSERT OR IGNORE INTO items (feed, guid, date, added, payload) VALUES (?, ?, ?, ?, ?)',
+                    (feed, key, date, now, payload)
+                )
+                if cursor.rowcount:
+                    new.append(item)
+                elif update:
+                    cursor.execute('UPDATE items SET date = ?, payload = ? WHERE feed = ? AND guid = ?',
+                                   (date, payload, feed, key))
+            return new
+        return self._transaction(_add) if rows else []
+
+    def put(self, item: RSSItem) -> None:
+        """
+        缓存一个item，缓存数量达到batch_size时批量写入
+        :param item:
+        :return:
+        """
+        self._buffer.append(item)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self, update: bool = False) -> List[RSSItem]:
+        """
+        写入put缓存的全部item，新加入的item同时记录在new_items中
+        :param update: 为True时用新数据覆盖已经存在的item
+        :return: 本次新加入的item
+        """
+        items, self._buffer = self._buffer, []
+        new = self.add(items, update=update)
+        self.new_items.extend(new)
+        return new
+
+    def __contains__(self, guid: str) -> bool:
+        """
+        检查默认订阅源中是否已经存在该guid，可以作为read_feed的seen参数
+        """
+        return self._conn.execute(
+            'SELECT 1 FROM items WHERE feed = ? AND guid = ?', (self.feed, guid)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def count(self, feed: Optional[str] = None) -> int:
+        """
+        :param feed: 订阅源名称，为None时使用默认值
+        :return: 订阅源中的item数量
+        """
+        feed = self.feed if feed is None else feed
+        return self._conn.execute('SELECT COUNT(*) FROM items WHERE feed = ?', (feed,)).fetchone()[0]
+
+    def latest(self, n: Optional[int] = None, since: Union[datetime.datetime, float, None] = None,
+               feed: Optional[str] = None) -> List[RSSItem]:
+        """
+        按发布时间从新到旧读取item，只读取需要的行
+        :param n: 最多读取的数量，为None时不限制
+        :param since: 只读取发布时间不早于该时间的item，可以是datetime或时间戳
+        :param feed: 订阅源名称，为None时使用默认值
+        :return:
+        """
+        feed = self.feed if feed is None else feed
+        sql = 'SELECT payload FROM items WHERE feed = ?'
+        args = [feed]
+        if since is not None:
+            sql += ' AND date >= ?'
+            args.append(to_timestamp(since))
+        sql += ' ORDER BY date DESC'
+        if n is not None:
+            sql += ' LIMIT ?'
+            args.append(n)
+        return [pickle.loads(row[0]) for row in self._conn.execute(sql, args)]
+
+    def materialize(self, rss: RSS2, n: Optional[int] = None,
+                    since: Union[datetime.datetime, float, None] = None, feed: Optional[str] = None) -> RSS2:
+        """
+        用存储中的item替换RSS2的items
+        :param rss:
+        :param n: 最新的n个item
+        :param since: 发布时间不早于该时间的item
+        :param feed: 订阅源名称，为None时使用默认值
+        :return: 传入的RSS2
+        """
+        rss.items = self.latest(n, since, feed)
+        return rss
+
+    def prune(self, keep: Optional[int] = None, max_age: Optional[float] = None,
+              feed: Optional[str] = None) -> int:
+        """
+        按保留策略删除旧的item
+        :param keep: 每个订阅源最多保留的最新item数量
+        :param max_age: 删除发布时间早于多少秒之前的item
+        :param feed: 订阅源名称，为None时使用默认值
+        :return: 删除的数量
+        """
+        feed = self.feed if feed is None else feed
+
+        def _prune(cursor):
+            deleted = 0
+            if max_age is not None:
+                cursor.execute('DELETE FROM items WHERE feed = ? AND date < ?', (feed, time.time() - max_age))
+                deleted += cursor.rowcount
+            if keep is not None:
+                cursor.execute(
+                    'DELETE FROM items WHERE feed = ? AND guid NOT IN '
+                    '(SELECT guid FROM items WHERE feed = ? ORDER BY date DESC LIMIT ?)', (feed, feed, keep)
+                )
+                deleted += cursor.rowcount
+            return deleted
+        return self._transaction(_prune)
+
+    def compact(self) -> None:
+        """
+        回收删除数据占用的空间，并将WAL合并到数据库文件
+        :return:
+        """
+        with self._lock:
+            self._conn.execute('VACUUM')
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self) -> None:
+        """
+        写入缓存的item并关闭数据库连接
+        :return:
+        """
+        if self._buffer:
+            self.flush()
+        self._conn.close()
+
+
+if __name__ == '__main__':
+    store = ItemStore('./xml/items.db', feed='demo')
+    store.put(RSSItem(title='标题', link='https://www.example.com/1', pubDate=datetime.datetime.now()))
+    print(store.flush())
+    print(store.materialize(RSS2(title='标题', link='https://www.example.com/', description='描述'), n=20).to_xml())
+    store.close()
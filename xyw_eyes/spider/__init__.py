@@ -1,2 +1,27 @@
-from xyw_eyes.spider.spider import Spider, Request
-from lxml import etree
+import importlib
+
+# 对外提供的名称及其所在模块，第一次访问时才导入，避免导入包时加载aiohttp、lxml等较重的依赖
+_lazy = {
+    'Spider': ('xyw_eyes.spider.spider', 'Spider'),
+    'Request': ('xyw_eyes.spider.request', 'Request'),
+    'Stage': ('xyw_eyes.spider.pipeline', 'Stage'),
+    'DropItem': ('xyw_eyes.spider.pipeline', 'DropItem'),
+    'etree': ('lxml.etree', None),
+}
+
+__all__ = list(_lazy)
+
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    module_name, attr = _lazy[name]
+    value = importlib.import_module(module_name)
+    if attr is not None:
+        value = getattr(value, attr)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
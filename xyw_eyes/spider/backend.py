@@ -0,0 +1,271 @@
+import gzip
+import zlib
+import asyncio
+import inspect
+from abc import abstractmethod, ABCMeta
+from urllib.parse import urlsplit
+from typing import Optional, Union, Callable, Dict, Type
+
+from aiohttp import ClientResponse, ClientSession, DummyCookieJar, http
+from aiohttp.connector import BaseConnector
+
+from xyw_eyes.spider.request import Request
+
+try:
+    # 可选依赖，安装后接受brotli压缩的响应
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# 自行解压时发送的Accept-Encoding，request中指定了Accept-Encoding时以request为准
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli is not None else 'gzip, deflate'
+
+
+def decompress(encoding: str, data: bytes) -> bytes:
+    """
+    按Content-Encoding解压响应内容，不支持的编码原样返回
+    :param encoding:
+    :param data:
+    :return:
+    """
+    if encoding in ('gzip', 'x-gzip'):
+        return gzip.decompress(data)
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(data)
+        except zlib.error:
+            # 部分服务器返回没有zlib头的原始deflate数据
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+    if encoding == 'br' and brotli is not None:
+        return brotli.decompress(data)
+    return data
+
+
+class Decompressor:
+    """
+    在aiohttp不自动解压时解压响应内容，超过threshold字节的内容在线程池中解压，避免阻塞事件循环
+    同时按域名统计传输的字节数和解压后的字节数
+    """
+
+    def __init__(self, threshold: int = 64 * 1024):
+        """
+        :param threshold: 压缩后超过该字节数的内容在线程池中解压
+        """
+        self.threshold = threshold
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    async def decode(self, resp: ClientResponse) -> None:
+        """
+        解压已经读取的响应内容，解压后的内容替换resp中缓存的内容
+        :param resp:
+        :return:
+        """
+        raw = resp._body or b''
+        encoding = resp.headers.get('Content-Encoding', '').strip().lower()
+        stats = self._stats.setdefault(urlsplit(str(resp.url)).hostname or '', {
+            'responses': 0, 'compressed': 0, 'transferred': 0, 'decoded': 0, 'offloaded': 0
+        })
+        stats['responses'] += 1
+        stats['transferred'] += len(raw)
+        body = raw
+        if encoding and encoding != 'identity' and raw:
+            if len(raw) > self.threshold:
+                body = await asyncio.get_running_loop().run_in_executor(None, decompress, encoding, raw)
+                stats['offloaded'] += 1
+            else:
+                body = decompress(encoding, raw)
+            if body is not raw:
+                stats['compressed'] += 1
+            resp._body = body
+        stats['decoded'] += len(body)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        各域名的统计数据：响应数、其中压缩的响应数、传输的字节数、解压后的字节数以及在线程池中解压的响应数
+        :return:
+        """
+        return {host: dict(stats) for host, stats in self._stats.items()}
+
+
+class Downloader(metaclass=ABCMeta):
+    """
+    下载后端的抽象类，Spider通过fetch下载request
+    fetch返回的响应需要已经读取了全部数据，并提供status、url、headers、read()、text()、json()等与ClientResponse相同的接口
+    """
+
+    async def open(self, connector: Optional[BaseConnector]) -> None:
+        """
+        在协程子线程中开始运行前调用
+        :param connector: 爬虫共用的connector，不使用aiohttp的后端可以忽略
+        :return:
+        """
+        pass
+
+    @abstractmethod
+    async def fetch(self, request: Request) -> ClientResponse:
+        """
+        下载request并读取全部数据
+        :param request:
+        :return:
+        """
+        pass
+
+    async def close(self) -> None:
+        """
+        爬取结束后在协程子线程中调用
+        :return:
+        """
+        pass
+
+    def transfer_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        各域名传输和解压的字节数，不统计的后端返回空字典
+        :return:
+        """
+        return {}
+
+
+class AiohttpDownloader(Downloader):
+    """
+    默认的下载后端，每个请求使用独立的ClientSession发送，与Request.request()的行为相同
+    设置了decompress_threshold时由aiohttp只读取压缩的内容，再由Decompressor解压，较大的内容在线程池中解压
+    """
+
+    def __init__(self, decompress_threshold: Optional[int] = None):
+        """
+        :param decompress_threshold: 压缩后超过该字节数的内容在线程池中解压，为None时由aiohttp在事件循环中解压
+        """
+        self.connector: Optional[BaseConnector] = None
+        self.decompressor = Decompressor(decompress_threshold) if decompress_threshold is not None else None
+
+    async def open(self, connector: Optional[BaseConnector]) -> None:
+        self.connector = connector
+
+    def _session_options(self) -> dict:
+        if self.decompressor is None:
+            return {}
+        return {'auto_decompress': False, 'headers': {'Accept-Encoding': ACCEPT_ENCODING}}
+
+    async def fetch(self, request: Request) -> ClientResponse:
+        if self.decompressor is None:
+            async with request.request(self.connector) as resp:
+                # 此处需要直接使用read()方法将数据下载下来
+                await resp.read()
+            return resp
+        # 与aiohttp.request相同，没有connector时由session创建并关闭
+        connector = request.connector if request.connector is not None else self.connector
+        options = self._session_options()
+        if request.loop is not None:
+            options['loop'] = request.loop
+        async with ClientSession(connector=connector, connector_owner=connector is None,
+                                 version=request.version, **options) as session:
+            async with session.request(request.method, request.url, **request.options()) as resp:
+                await resp.read()
+        await self.decompressor.decode(resp)
+        return resp
+
+    async def close(self) -> None:
+        self.connector = None
+
+    def transfer_stats(self) -> Dict[str, Dict[str, int]]:
+        return self.decompressor.stats() if self.decompressor is not None else {}
+
+
+class AiohttpSessionDownloader(AiohttpDownloader):
+    """
+    所有请求共用一个ClientSession，省去aiohttp.request每次创建和关闭ClientSession的开销
+    为保持与默认后端相同的行为，不在请求之间保存cookie
+    指定了connector、loop或非HTTP/1.1版本的request仍然通过aiohttp.request发送
+    """
+
+    def __init__(self, decompress_threshold: Optional[int] = None):
+        super().__init__(decompress_threshold)
+        self.session: Optional[ClientSession] = None
+
+    async def open(self, connector: Optional[BaseConnector]) -> None:
+        await super().open(connector)
+        self.session = ClientSession(
+            connector=connector,
+            connector_owner=connector is None,
+            cookie_jar=DummyCookieJar(),
+            **self._session_options()
+        )
+
+    async def fetch(self, request: Request) -> ClientResponse:
+        if self.session is None or request.connector is not None or request.loop is not None \
+                or request.version != http.HttpVersion11:
+            return await super().fetch(request)
+        async with self.session.request(request.method, request.url, **request.options()) as resp:
+            await resp.read()
+        if self.decompressor is not None:
+            await self.decompressor.decode(resp)
+        return resp
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        await super().close()
+
+
+# 可以通过名称选择的下载后端
+DOWNLOADERS: Dict[str, Type[Downloader]] = {
+    'aiohttp': AiohttpDownloader,
+    'aiohttp-session': AiohttpSessionDownloader,
+}
+
+
+def create_downloader(backend: Union[str, Downloader, Type[Downloader]],
+                      decompress_threshold: Optional[int] = None) -> Downloader:
+    """
+    根据名称、类或实例创建下载后端
+    :param backend:
+    :param decompress_threshold: 传给AiohttpDownloader及其子类，传入实例时不使用
+    :return:
+    """
+    if isinstance(backend, Downloader):
+        return backend
+    if not inspect.isclass(backend):
+        backend = DOWNLOADERS.get(backend)
+    if inspect.isclass(backend) and issubclass(backend, AiohttpDownloader):
+        return backend(decompress_threshold)
+    if inspect.isclass(backend) and issubclass(backend, Downloader):
+        return backend()
+    raise ValueError('downloader_backend must be one of %s or a Downloader' % ', '.join(DOWNLOADERS))
+
+
+def _uvloop_factory() -> asyncio.AbstractEventLoop:
+    import uvloop
+    return uvloop.new_event_loop()
+
+
+# 可以通过名称选择的事件循环，'auto'在安装了uvloop时使用uvloop
+EVENT_LOOPS: Dict[str, Callable[[], asyncio.AbstractEventLoop]] = {
+    'asyncio': asyncio.new_event_loop,
+    'uvloop': _uvloop_factory,
+}
+
+
+def loop_factory(name: Union[str, Callable[[], asyncio.AbstractEventLoop]]) -> Callable[[], asyncio.AbstractEventLoop]:
+    """
+    根据名称获取创建事件循环的函数，也可以直接传入函数
+    :param name: 'asyncio'、'uvloop'或'auto'
+    :return:
+    """
+    if callable(name):
+        return name
+    if name == 'auto':
+        try:
+            import uvloop
+        except ImportError:
+            return asyncio.new_event_loop
+        return uvloop.new_event_loop
+    if name not in EVENT_LOOPS:
+        raise ValueError('event_loop must be one of %s, auto or a callable' % ', '.join(EVENT_LOOPS))
+    if name == 'uvloop':
+        # 在创建爬虫时就检查是否已经安装
+        import uvloop
+    return EVENT_LOOPS[name]
@@ -0,0 +1,155 @@
+import time
+import json
+import asyncio
+import hashlib
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Optional, Callable, Awaitable, Tuple, Dict, Any
+
+from xyw_eyes.spider.request import Request, _field_defaults
+
+# 可以合并的请求方法，只合并不会修改服务器状态的请求
+COALESCE_METHODS = ('GET', 'HEAD')
+
+
+# 已经包含在请求指纹中、不影响响应内容或不能合并的字段，其余字段与默认值不同时都计入合并请求的键
+_KEY_EXCLUDED = frozenset({
+    'url', 'method', 'params', 'data', 'json', 'timeout', 'connector', 'loop',
+    'metadata', 'retry_times', 'priority', 'depth', 'source',
+})
+
+
+class _LeaderCancelled(Exception):
+    """
+    负责下载的请求被取消时通知等待中的请求，由其中之一重新下载
+    """
+
+
+def flight_key(request: Request) -> Optional[str]:
+    """
+    合并请求使用的键，在请求指纹的基础上加入与默认值不同的其他请求参数，例如请求头、cookie、认证信息、
+    是否跟随重定向以及代理，这些参数不同时响应可能不同；超时时间只影响等待时间，不计入
+    :param request:
+    :return: 不能合并的请求返回None：非GET、HEAD请求，以及指定了connector或loop的请求
+    """
+    if request.method.upper() not in COALESCE_METHODS or request.connector is not None or request.loop is not None:
+        return None
+    extra = []
+    for name, default in _field_defaults():
+        if name in _KEY_EXCLUDED:
+            continue
+        value = getattr(request, name)
+        if value is not default and value != default:
+            extra.append((name, sorted(value.items()) if hasattr(value, 'items') else value))
+    if not extra:
+        return request.fingerprint()
+    text = json.dumps([request.fingerprint(), extra], default=str, ensure_ascii=False)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """
+    合并同时进行的相同请求：同一个键同时只下载一次，其余请求等待其结果，下载失败时所有请求都收到同一个异常
+    可以在多个线程的事件循环之间共用，同一进程中的多个爬虫因此可以共享下载
+    ttl大于0时，下载成功的响应在ttl秒内直接返回给之后的相同请求
+    """
+
+    def __init__(self, max_cached: int = 1024):
+        """
+        :param max_cached: 缓存的响应数上限，超出时先删除过期的响应，仍然超出时删除最早缓存的响应
+        """
+        self.max_cached = max_cached
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        # 键到(过期时间, 响应)
+        self._cache: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        # 实际下载的次数、合并到同时进行的下载中的次数以及命中缓存的次数
+        self.downloads = 0
+        self.coalesced = 0
+        self.hits = 0
+
+    def _lookup(self, key: str) -> Tuple[Optional[Any], Optional[concurrent.futures.Future], bool]:
+        """
+        :return: (缓存的响应, 需要等待或由本请求完成的future, 是否由本请求下载)
+        """
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.hits += 1
+                    return entry[1], None, False
+                del self._cache[key]
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return None, future, False
+            future = self._inflight[key] = concurrent.futures.Future()
+            self.downloads += 1
+            return None, future, True
+
+    def _store(self, key: str, response, ttl: float) -> None:
+        # 调用时需要持有锁
+        now = time.monotonic()
+        self._cache[key] = (now + ttl, response)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.max_cached:
+            for name in [name for name, (expire, _) in self._cache.items() if expire <= now]:
+                del self._cache[name]
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    async def fetch(self, key: str, download: Callable[[], Awaitable], ttl: float = 0,
+                    cacheable: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, bool]:
+        """
+        下载或等待同时进行的相同下载
+        :param key: flight_key的返回值
+        :param download: 实际下载的协程函数
+        :param ttl: 下载成功的响应的缓存时间（秒），为0时不缓存
+        :param cacheable: 判断响应是否可以缓存的函数，为None时都可以缓存
+        :return: (响应, 是否为其他请求下载的响应)，其他请求下载的响应与之共用，使用前需要复制
+        """
+        while True:
+            response, future, leader = self._lookup(key)
+            if response is not None:
+                return response, True
+            if leader:
+                break
+            try:
+                # 本请求被取消时不能取消共用的future
+                return await asyncio.shield(asyncio.wrap_future(future)), True
+            except _LeaderCancelled:
+                continue
+        try:
+            response = await download()
+        except asyncio.CancelledError:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            if ttl > 0 and (cacheable is None or cacheable(response)):
+                self._store(key, response, ttl)
+        future.set_result(response)
+        return response, False
+
+    def clear(self) -> None:
+        """
+        清空缓存的响应
+        :return:
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {'downloads': self.downloads, 'coalesced': self.coalesced, 'hits': self.hits}
+
+
+# 同一进程中使用默认下载后端的爬虫共用的实例
+shared_flight = SingleFlight()
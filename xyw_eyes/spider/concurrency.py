@@ -0,0 +1,229 @@
+import time
+import asyncio
+from collections import deque
+from contextvars import ContextVar
+from logging import Logger
+from typing import Optional, Dict
+
+
+# 视为服务器限流或过载的状态码
+THROTTLE_STATUS = frozenset({429, 500, 502, 503, 504, 509, 520, 521, 522, 524})
+
+# 当前下载的截止时间（time.monotonic()），超时时下载以取消的形式结束，需要据此区分超时和普通的取消
+download_deadline: ContextVar[Optional[float]] = ContextVar('download_deadline', default=None)
+
+
+class HostLimit:
+    """
+    单个域名的可调并发上限，上限降低时已经在进行的下载不受影响，新的下载需要等待
+    """
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters = deque()
+
+    async def acquire(self) -> None:
+        while self.in_flight >= int(self.limit):
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+                raise
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.wake()
+
+    def wake(self) -> None:
+        """
+        唤醒等待中的下载，数量不超过当前空闲的名额
+        """
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                free -= 1
+
+
+class HostStats:
+    """
+    单个域名的观测数据
+    """
+
+    def __init__(self):
+        # 响应时间的指数加权平均值
+        self.latency: Optional[float] = None
+        # 观测到的最小平均响应时间，作为该域名的基准响应时间
+        self.base_latency: Optional[float] = None
+        self.success = 0
+        self.throttled = 0
+        self.errors = 0
+        self.decreases = 0
+        # 上次降低并发上限的时间
+        self.last_decrease = 0.0
+
+
+class Sample:
+    """
+    一次下载的观测结果，下载完成后设置status
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.status: Optional[int] = None
+        self.start = time.monotonic()
+
+
+class AdaptiveConcurrency:
+    """
+    按域名自适应调整并发下载数的控制器（AIMD）
+    响应正常时每个往返加性增加increase，出现限流状态码、超时、连接错误或响应时间超过基准latency_tolerance倍时乘性减少为decrease倍
+    同一域名两次减少之间至少间隔一个平均响应时间，避免同一批失败连续减少
+    """
+
+    def __init__(self,
+                 start: int = 8,
+                 floor: int = 1,
+                 ceiling: int = 64,
+                 increase: float = 1.0,
+                 decrease: float = 0.5,
+                 latency_tolerance: float = 3.0,
+                 smoothing: float = 0.2,
+                 logger: Optional[Logger] = None):
+        """
+        :param start: 每个域名的初始并发上限
+        :param floor: 并发上限的最小值
+        :param ceiling: 并发上限的最大值
+        :param increase: 每个往返增加的并发数
+        :param decrease: 出现拥塞信号时并发上限乘以的系数
+        :param latency_tolerance: 响应时间超过基准响应时间多少倍时视为拥塞
+        :param smoothing: 响应时间指数加权平均的系数
+        :param logger: 用于记录并发上限变化的日志
+        """
+        if not 1 <= floor <= start <= ceiling:
+            raise ValueError('floor <= start <= ceiling is required and floor must be no less than 1')
+        if not 0 < decrease < 1:
+            raise ValueError('decrease must be between 0 and 1')
+        self.start = start
+        self.floor = floor
+        self.ceiling = ceiling
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.logger = logger
+        self._limits: Dict[str, HostLimit] = {}
+        self._stats: Dict[str, HostStats] = {}
+
+    def _get(self, host: str):
+        if host not in self._limits:
+            self._limits[host] = HostLimit(self.start)
+            self._stats[host] = HostStats()
+        return self._limits[host], self._stats[host]
+
+    def track(self, host: str) -> '_Slot':
+        """
+        获取一个下载名额，用法：async with controller.track(host) as sample: ...; sample.status = resp.status
+        :param host:
+        :return:
+        """
+        return _Slot(self, host)
+
+    def feedback(self, sample: Sample, error: Optional[BaseException] = None) -> None:
+        """
+        根据一次下载的结果调整该域名的并发上限
+        :param sample:
+        :param error: 下载过程中出现的异常
+        :return:
+        """
+        limit, stats = self._get(sample.host)
+        latency = time.monotonic() - sample.start
+        old = limit.limit
+        reason = 'success'
+
+        if error is not None or sample.status is None:
+            if isinstance(error, asyncio.CancelledError):
+                # 超过下载的超时时间而被取消时按超时处理，其余的取消不代表服务器拥塞
+                deadline = download_deadline.get()
+                if deadline is None or time.monotonic() < deadline:
+                    return
+                reason = 'error: timeout'
+            else:
+                reason = 'error: %s' % type(error).__name__
+            stats.errors += 1
+            self._decrease(limit, stats)
+        elif sample.status in THROTTLE_STATUS:
+            stats.throttled += 1
+            reason = 'status: %d' % sample.status
+            self._decrease(limit, stats)
+        else:
+            stats.success += 1
+            if stats.latency is None:
+                stats.latency = latency
+            else:
+                stats.latency += self.smoothing * (latency - stats.latency)
+            if stats.base_latency is None or stats.latency < stats.base_latency:
+                stats.base_latency = stats.latency
+            if latency > stats.base_latency * self.latency_tolerance and stats.success > 1:
+                reason = 'latency: %.3fs' % latency
+                self._decrease(limit, stats)
+            else:
+                # 每完成limit次下载约增加increase
+                limit.limit = min(self.ceiling, limit.limit + self.increase / limit.limit)
+
+        if int(limit.limit) != int(old):
+            if self.logger is not None:
+                self.logger.info('调整并发下载上限（%s）：%s %d -> %d' % (reason, sample.host, int(old), int(limit.limit)))
+            limit.wake()
+
+    def _decrease(self, limit: HostLimit, stats: HostStats) -> None:
+        now = time.monotonic()
+        if now - stats.last_decrease < (stats.latency or 0):
+            return
+        stats.last_decrease = now
+        stats.decreases += 1
+        limit.limit = max(self.floor, limit.limit * self.decrease)
+
+    def stats(self) -> dict:
+        """
+        导出各域名当前的并发上限以及观测数据
+        :return:
+        """
+        return {
+            host: {
+                'limit': int(self._limits[host].limit),
+                'in_flight': self._limits[host].in_flight,
+                'latency': stats.latency,
+                'base_latency': stats.base_latency,
+                'success': stats.success,
+                'throttled': stats.throttled,
+                'errors': stats.errors,
+                'decreases': stats.decreases,
+            }
+            for host, stats in self._stats.items()
+        }
+
+
+class _Slot:
+    def __init__(self, controller: AdaptiveConcurrency, host: str):
+        self.controller = controller
+        self.host = host
+        self.sample = None
+
+    async def __aenter__(self) -> Sample:
+        limit, _ = self.controller._get(self.host)
+        await limit.acquire()
+        self.sample = Sample(self.host)
+        return self.sample
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            self.controller.feedback(self.sample, exc)
+        finally:
+            self.controller._limits[self.host].release()
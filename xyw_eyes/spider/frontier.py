@@ -0,0 +1,258 @@
+import os
+import time
+import uuid
+import pickle
+import sqlite3
+import threading
+from abc import abstractmethod, ABCMeta
+from typing import List, Tuple, Iterable, Any
+
+from xyw_eyes.spider.request import Request
+
+
+class Frontier(metaclass=ABCMeta):
+    """
+    共享请求边界（frontier）的抽象类，多个worker进程通过同一个frontier分担同一个爬虫的请求
+    frontier同时负责去重集合、完成检测以及将item汇总到唯一的写入进程
+    """
+
+    @abstractmethod
+    def seed(self, requests: Iterable[Request]) -> bool:
+        """
+        写入起始请求，整个爬取过程中只有第一次调用会生效
+        :param requests:
+        :return: 本次调用是否实际写入了起始请求
+        """
+        pass
+
+    @abstractmethod
+    def push(self, requests: Iterable[Request]) -> int:
+        """
+        向frontier中加入请求，未重试过的请求会按指纹去重
+        :param requests:
+        :return: 实际加入的请求数量
+        """
+        pass
+
+    @abstractmethod
+    def claim(self, worker_id: str, n: int = 1) -> List[Tuple[Any, Request]]:
+        """
+        按优先级领取最多n个待处理的请求，领取的同时将该worker标记为忙碌
+        :param worker_id:
+        :param n:
+        :return: (请求编号, 请求)组成的列表
+        """
+        pass
+
+    @abstractmethod
+    def ack(self, request_id: Any) -> None:
+        """
+        确认领取的请求已经处理完成
+        :param request_id:
+        :return:
+        """
+        pass
+
+    @abstractmethod
+    def heartbeat(self, worker_id: str, busy: bool) -> bool:
+        """
+        更新worker状态，并检查整个爬取过程是否已经结束
+        :param worker_id:
+        :param busy: 该worker本地是否还有未完成的任务
+        :return: 所有worker均空闲且没有待处理请求时返回True
+        """
+        pass
+
+    @abstractmethod
+    def push_items(self, items: Iterable[Any]) -> None:
+        """
+        将item交给唯一的写入进程处理
+        :param items:
+        :return:
+        """
+        pass
+
+    @abstractmethod
+    def pop_items(self, n: int = 100) -> List[Any]:
+        """
+        写入进程取出最多n个item
+        :param n:
+        :return:
+        """
+        pass
+
+    @abstractmethod
+    def finished(self) -> bool:
+        """
+        不更新任何worker状态，仅检查爬取过程是否已经结束
+        :return:
+        """
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """
+        清空frontier，用于开始新一轮爬取
+        :return:
+        """
+        pass
+
+    @staticmethod
+    def new_worker_id() -> str:
+        """
+        生成worker编号，同一主机上的不同进程以及不同主机之间均不会重复
+        :return:
+        """
+        return '%d-%s' % (os.getpid(), uuid.uuid4().hex)
+
+
+class SqliteFrontier(Frontier):
+    """
+    基于SQLite的frontier实现，适用于同一主机上的多个worker进程
+    请求和item使用pickle序列化，worker超过lease秒没有心跳时视为已退出，其领取的请求会重新放回frontier
+    """
+
+    def __init__(self, path: str, lease: float = 60, timeout: float = 30):
+        """
+        :param path: 数据库文件路径，所有worker需使用同一个文件
+        :param lease: worker心跳超时时间，单位秒
+        :param timeout: 等待数据库锁的最长时间，单位秒
+        """
+        dir_path = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+        self.path = path
+        self.lease = lease
+        # 连接会在协程子线程中用于ack，因此允许跨线程使用并自行加锁
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                priority INTEGER NOT NULL DEFAULT 0,
+                payload BLOB NOT NULL,
+                worker TEXT
+            );
+            CREATE INDEX IF NOT EXISTS requests_worker ON requests (worker);
+            CREATE INDEX IF NOT EXISTS requests_priority ON requests (priority DESC, id);
+            CREATE TABLE IF NOT EXISTS seen (fingerprint TEXT PRIMARY KEY) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, busy INTEGER NOT NULL, heartbeat REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY AUTOINCREMENT, payload BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        ''')
+
+    def _transaction(self, func, *args):
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(cursor, *args)
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+            return result
+
+    @staticmethod
+    def _insert(cursor, requests: Iterable[Request]) -> int:
+        count = 0
+        for request in requests:
+            # 重试的请求必然已经出现过，不参与去重
+            if not request.retry_times:
+                cursor.execute('INSERT OR IGNORE INTO seen (fingerprint) VALUES (?)', (request.fingerprint(),))
+                if not cursor.rowcount:
+                    continue
+            cursor.execute(
+                'INSERT INTO requests (priority, payload) VALUES (?, ?)', (request.priority, pickle.dumps(request))
+            )
+            count += 1
+        return count
+
+    def _reap(self, cursor) -> None:
+        """
+        将心跳超时的worker领取的请求放回frontier，并删除这些worker
+        """
+        deadline = time.time() - self.lease
+        stale = [row[0] for row in cursor.execute('SELECT id FROM workers WHERE heartbeat < ?', (deadline,))]
+        for worker_id in stale:
+            cursor.execute('UPDATE requests SET worker = NULL WHERE worker = ?', (worker_id,))
+            cursor.execute('DELETE FROM workers WHERE id = ?', (worker_id,))
+
+    @staticmethod
+    def _finished(cursor) -> bool:
+        if cursor.execute("SELECT 1 FROM meta WHERE key = 'seeded'").fetchone() is None:
+            return False
+        if cursor.execute('SELECT 1 FROM requests LIMIT 1').fetchone() is not None:
+            return False
+        return cursor.execute('SELECT 1 FROM workers WHERE busy = 1 LIMIT 1').fetchone() is None
+
+    def seed(self, requests: Iterable[Request]) -> bool:
+        def _seed(cursor):
+            cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('seeded', '1')")
+            if not cursor.rowcount:
+                return False
+            self._insert(cursor, requests)
+            return True
+        return self._transaction(_seed)
+
+    def push(self, requests: Iterable[Request]) -> int:
+        return self._transaction(self._insert, list(requests))
+
+    def claim(self, worker_id: str, n: int = 1) -> List[Tuple[Any, Request]]:
+        def _claim(cursor):
+            self._reap(cursor)
+            rows = cursor.execute(
+                'SELECT id, payload FROM requests WHERE worker IS NULL ORDER BY priority DESC, id LIMIT ?', (n,)
+            ).fetchall()
+            for row_id, _ in rows:
+                cursor.execute('UPDATE requests SET worker = ? WHERE id = ?', (worker_id, row_id))
+            if rows:
+                cursor.execute(
+                    'INSERT OR REPLACE INTO workers (id, busy, heartbeat) VALUES (?, 1, ?)', (worker_id, time.time())
+                )
+            return [(row_id, pickle.loads(payload)) for row_id, payload in rows]
+        return self._transaction(_claim)
+
+    def ack(self, request_id: Any) -> None:
+        self._transaction(lambda cursor: cursor.execute('DELETE FROM requests WHERE id = ?', (request_id,)))
+
+    def heartbeat(self, worker_id: str, busy: bool) -> bool:
+        def _heartbeat(cursor):
+            cursor.execute(
+                'INSERT OR REPLACE INTO workers (id, busy, heartbeat) VALUES (?, ?, ?)',
+                (worker_id, 1 if busy else 0, time.time())
+            )
+            self._reap(cursor)
+            return self._finished(cursor)
+        return self._transaction(_heartbeat)
+
+    def push_items(self, items: Iterable[Any]) -> None:
+        def _push(cursor):
+            cursor.executemany('INSERT INTO items (payload) VALUES (?)', [(pickle.dumps(item),) for item in items])
+        self._transaction(_push)
+
+    def pop_items(self, n: int = 100) -> List[Any]:
+        def _pop(cursor):
+            rows = cursor.execute('SELECT id, payload FROM items ORDER BY id LIMIT ?', (n,)).fetchall()
+            if rows:
+                cursor.execute('DELETE FROM items WHERE id <= ?', (rows[-1][0],))
+            return [pickle.loads(payload) for _, payload in rows]
+        return self._transaction(_pop)
+
+    def finished(self) -> bool:
+        def _finished(cursor):
+            self._reap(cursor)
+            return self._finished(cursor)
+        return self._transaction(_finished)
+
+    def clear(self) -> None:
+        def _clear(cursor):
+            for table in ('requests', 'seen', 'workers', 'items', 'meta'):
+                cursor.execute('DELETE FROM %s' % table)
+        self._transaction(_clear)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,8 +1,12 @@
+import pickle
+
 from xyw_eyes.spider.request import Request
 
 
 class Item:
-    def __init__(self, data: dict, request: Request, retry_times: int = 0):
+    __slots__ = ('data', 'request', 'retry_times', 'stage')
+
+    def __init__(self, data: dict, request: Request, retry_times: int = 0, stage: int = 0):
         if not isinstance(data, dict):
             raise TypeError('dict only')
         if not isinstance(retry_times, int):
@@ -10,10 +14,25 @@ class Item:
         self.data = data
         self.request = request
         self.retry_times = retry_times
+        # 下一个要运行的处理阶段的序号
+        self.stage = stage
 
     def increase_retry_times(self):
         self.retry_times = self.retry_times + 1
 
+    def to_bytes(self) -> bytes:
+        """
+        序列化结果，request使用紧凑的格式，用于写入磁盘
+        :return:
+        """
+        return pickle.dumps((self.data, self.request.to_bytes(), self.retry_times, self.stage),
+                            pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Item':
+        item_data, request, retry_times, stage = pickle.loads(data)
+        return cls(item_data, Request.from_bytes(request), retry_times, stage)
+
 
 if __name__ == '__main__':
     item = Item({'xue': 1}, 0)
@@ -0,0 +1,355 @@
+import os
+import re
+import json
+import asyncio
+import hashlib
+import mimetypes
+from urllib.parse import urlsplit
+from typing import Optional, Dict, Callable, Awaitable, Iterator
+
+from aiohttp import ClientTimeout
+from aiohttp.connector import BaseConnector
+
+from xyw_eyes.spider.request import Request
+
+# Content-Range: bytes 0-0/12345
+_CONTENT_RANGE = re.compile(r'bytes\s+(\d+)-\d+/(\d+|\*)')
+# 下载索引文件名，记录链接与本地文件、内容摘要的对应关系
+INDEX_NAME = '.media-index.json'
+
+
+class MediaFile:
+    """
+    媒体文件的信息，只探测时path和digest为None
+    """
+    __slots__ = ('url', 'length', 'type', 'path', 'digest')
+
+    def __init__(self, url: str, length: Optional[int] = None, type: Optional[str] = None,
+                 path: Optional[str] = None, digest: Optional[str] = None):
+        self.url = url
+        self.length = length
+        self.type = type
+        self.path = path
+        self.digest = digest
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def find_enclosures(data) -> Iterator:
+    """
+    查找item中的Enclosure，包括RSSItem的enclosure以及列表、字典中的Enclosure
+    :param data:
+    :return:
+    """
+    from xyw_eyes.rss.rss import Enclosure, RSSItem
+    if isinstance(data, Enclosure):
+        yield data
+    elif isinstance(data, RSSItem):
+        if data.enclosure is not None:
+            yield data.enclosure
+    elif isinstance(data, dict):
+        for value in data.values():
+            yield from find_enclosures(value)
+    elif isinstance(data, (list, tuple)):
+        for value in data:
+            yield from find_enclosures(value)
+
+
+class MediaPipeline:
+    """
+    媒体文件处理：通过HEAD或只请求第一个字节获取Enclosure的length和type，
+    可选地将文件分块流式写入磁盘，中断的下载可以断点续传，按链接和内容摘要去重
+    """
+
+    def __init__(self,
+                 directory: Optional[str] = None,
+                 concurrency: int = 4,
+                 chunk_size: int = 64 * 1024,
+                 max_size: int = 0,
+                 prepare: Optional[Callable[[Request], Awaitable[Request]]] = None,
+                 logger=None):
+        """
+        :param directory: 下载文件保存的目录，为None时只获取length和type，不下载
+        :param concurrency: 同时进行的探测和下载数上限
+        :param chunk_size: 每次写入磁盘的字节数
+        :param max_size: 超过该字节数的文件不下载，为0时不限制
+        :param prepare: 发送请求前处理request的函数，例如爬虫的media_middlewares
+        :param logger:
+        """
+        self.directory = directory
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.prepare = prepare
+        self.logger = logger
+        # 共用的connector，为None时每个请求使用独立的连接
+        self.connector: Optional[BaseConnector] = None
+        # 信号量绑定到使用它的事件循环，爬虫每次运行都使用新的事件循环，因此在运行时按事件循环创建
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 已经处理过的链接
+        self._files: Dict[str, MediaFile] = {}
+        # 内容摘要到本地文件路径的映射，内容相同的文件只保留一份
+        self._paths: Dict[str, str] = {}
+        # 正在处理的链接，同一链接同时只处理一次
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._index_loaded = False
+        self.probed = 0
+        self.downloaded = 0
+        self.downloaded_bytes = 0
+        self.deduplicated = 0
+        self.failed = 0
+
+    def _log(self, level: str, message: str, **kwargs) -> None:
+        if self.logger is not None:
+            getattr(self.logger, level)(message, **kwargs)
+
+    def _load_index(self) -> None:
+        if self._index_loaded:
+            return
+        self._index_loaded = True
+        if self.directory is None:
+            return
+        try:
+            with open(os.path.join(self.directory, INDEX_NAME), 'r', encoding='utf-8') as fp:
+                index = json.load(fp)
+        except (OSError, ValueError):
+            return
+        for url, info in index.items():
+            # 文件已被删除的记录不再使用
+            if info.get('path') and os.path.isfile(info['path']):
+                media = MediaFile(**info)
+                self._files[url] = media
+                self._paths.setdefault(media.digest, media.path)
+
+    def save_index(self) -> None:
+        """
+        保存下载索引，下次运行时已下载的链接不会重复下载
+        :return:
+        """
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        index = {url: media.to_dict() for url, media in self._files.items() if media.path is not None}
+        path = os.path.join(self.directory, INDEX_NAME)
+        with open(path + '.tmp', 'w', encoding='utf-8') as fp:
+            json.dump(index, fp, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def get(self, url: str) -> Optional[MediaFile]:
+        """
+        获取已经处理过的链接的信息
+        :param url:
+        :return:
+        """
+        self._load_index()
+        return self._files.get(url)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def _request(self, request: Request):
+        if self.prepare is not None:
+            request = await self.prepare(request)
+        return request.request(self.connector)
+
+    def file_path(self, url: str, type: Optional[str] = None) -> str:
+        """
+        链接对应的本地文件路径，文件名为链接的摘要加扩展名
+        :param url:
+        :param type: 链接中没有扩展名时根据类型猜测扩展名
+        :return:
+        """
+        ext = os.path.splitext(urlsplit(url).path)[1]
+        if not re.fullmatch(r'\.[\w-]{1,10}', ext):
+            ext = (mimetypes.guess_extension(type.split(';')[0].strip()) if type else None) or ''
+        return os.path.join(self.directory, hashlib.blake2b(url.encode('utf-8'), digest_size=16).hexdigest() + ext)
+
+    async def probe(self, url: str) -> MediaFile:
+        """
+        获取文件的长度和类型，不下载文件内容
+        先发送HEAD请求，不支持HEAD或没有返回长度时请求第一个字节，从Content-Range中获取总长度
+        :param url:
+        :return:
+        """
+        media = self.get(url)
+        if media is not None and media.length is not None:
+            return media
+        media = MediaFile(url)
+        timeout = ClientTimeout(total=30)
+        async with self._get_semaphore():
+            try:
+                async with await self._request(Request(url, method='HEAD', timeout=timeout)) as resp:
+                    if resp.status < 400:
+                        media.type = resp.content_type
+                        if resp.content_length is not None:
+                            media.length = resp.content_length
+            except Exception:
+                self._log('warning', 'HEAD请求失败：%s' % url, exc_info=True)
+            if media.length is None:
+                request = Request(url, headers={'Range': 'bytes=0-0'}, timeout=timeout)
+                async with await self._request(request) as resp:
+                    resp.raise_for_status()
+                    media.type = resp.content_type
+                    match = _CONTENT_RANGE.match(resp.headers.get('Content-Range', ''))
+                    if resp.status == 206 and match and match.group(2) != '*':
+                        media.length = int(match.group(2))
+                    elif resp.status == 200:
+                        # 服务器不支持Range，不读取内容直接关闭连接
+                        media.length = resp.content_length
+                        resp.close()
+        self.probed += 1
+        self._files.setdefault(url, media)
+        return media
+
+    async def download(self, url: str) -> MediaFile:
+        """
+        将文件分块写入磁盘，同一链接同时只下载一次
+        存在未完成的.part文件时使用Range继续下载，服务器不支持时重新下载
+        :param url:
+        :return:
+        """
+        if self.directory is None:
+            raise RuntimeError('directory can not be empty')
+        media = self.get(url)
+        if media is not None and media.path is not None:
+            return media
+        if url in self._pending:
+            return await asyncio.shield(self._pending[url])
+        future = asyncio.get_running_loop().create_future()
+        self._pending[url] = future
+        try:
+            async with self._get_semaphore():
+                media = await self._download(url)
+            future.set_result(media)
+            return media
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他协程等待时避免出现未获取异常的警告
+            future.exception()
+            raise
+        finally:
+            del self._pending[url]
+
+    async def _download(self, url: str) -> MediaFile:
+        import aiofiles
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.file_path(url)
+        part = path + '.part'
+        offset = os.path.getsize(part) if os.path.isfile(part) else 0
+        headers = {'Range': 'bytes=%d-' % offset} if offset else None
+        hasher = hashlib.blake2b(digest_size=16)
+
+        async with await self._request(Request(url, headers=headers, timeout=ClientTimeout(total=None,
+                                                                                          sock_read=60))) as resp:
+            if resp.status == 416 and offset:
+                # 请求的范围超出文件长度，说明.part已经是完整的文件
+                length = offset
+            else:
+                resp.raise_for_status()
+                match = _CONTENT_RANGE.match(resp.headers.get('Content-Range', ''))
+                if resp.status != 206 or not match or int(match.group(1)) != offset:
+                    offset = 0
+                length = offset + resp.content_length if resp.content_length is not None else None
+                if self.max_size and length is not None and length > self.max_size:
+                    raise ValueError('file size %d exceeds max_size %d: %s' % (length, self.max_size, url))
+            if offset:
+                self._log('info', '从第%d字节继续下载：%s' % (offset, url))
+                # 已下载的部分也要参与内容摘要的计算
+                async with aiofiles.open(part, 'rb') as fp:
+                    while True:
+                        chunk = await fp.read(self.chunk_size)
+                        if not chunk:
+                            break
+                        hasher.update(chunk)
+            size = offset
+            if resp.status != 416:
+                async with aiofiles.open(part, 'ab' if offset else 'wb') as fp:
+                    async for chunk in resp.content.iter_chunked(self.chunk_size):
+                        size += len(chunk)
+                        if self.max_size and size > self.max_size:
+                            break
+                        hasher.update(chunk)
+                        await fp.write(chunk)
+                        self.downloaded_bytes += len(chunk)
+            content_type = resp.content_type if resp.status != 416 else None
+
+        if self.max_size and size > self.max_size:
+            # 超过上限的部分文件不保留，避免下次继续下载
+            os.remove(part)
+            raise ValueError('file size exceeds max_size %d: %s' % (self.max_size, url))
+        if length is not None and size != length:
+            raise ValueError('incomplete download %d/%d bytes: %s' % (size, length, url))
+        digest = hasher.hexdigest()
+        if digest in self._paths and os.path.isfile(self._paths[digest]):
+            # 其他链接已经下载过相同内容的文件
+            os.remove(part)
+            path = self._paths[digest]
+            self.deduplicated += 1
+            self._log('info', '文件内容与已下载的文件相同：%s %s' % (url, path))
+        else:
+            os.replace(part, path)
+            self._paths[digest] = path
+            self.downloaded += 1
+        media = MediaFile(url, size, content_type or (self._files[url].type if url in self._files else None),
+                          path, digest)
+        self._files[url] = media
+        return media
+
+    async def process(self, enclosure) -> MediaFile:
+        """
+        处理一个Enclosure：设置了下载目录时下载文件，否则只探测，并填充缺少的length和type
+        :param enclosure:
+        :return:
+        """
+        if self.directory is not None:
+            media = await self.download(enclosure.url)
+        elif not enclosure.length or not enclosure.type:
+            media = await self.probe(enclosure.url)
+        else:
+            return MediaFile(enclosure.url, enclosure.length, enclosure.type)
+        if not enclosure.length and media.length is not None:
+            enclosure.length = media.length
+        if not enclosure.type and media.type:
+            enclosure.type = media.type
+        return media
+
+    async def process_item(self, data) -> int:
+        """
+        处理item中的全部Enclosure，单个Enclosure失败（例如链接失效或文件过大）时只记录日志，
+        保留原来的length和type，不影响其他Enclosure以及item本身
+        :param data:
+        :return: 处理成功的Enclosure数量
+        """
+        enclosures = list(find_enclosures(data))
+        if not enclosures:
+            return 0
+        results = await asyncio.gather(*[self.process(enclosure) for enclosure in enclosures],
+                                       return_exceptions=True)
+        success = 0
+        for enclosure, result in zip(enclosures, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException):
+                self.failed += 1
+                self._log('warning', '处理媒体文件失败：%s' % enclosure.url, exc_info=result)
+            else:
+                success += 1
+        return success
+
+    def stats(self) -> dict:
+        """
+        :return: 探测、下载、去重以及失败的数量
+        """
+        return {
+            'probed': self.probed,
+            'downloaded': self.downloaded,
+            'downloaded_bytes': self.downloaded_bytes,
+            'deduplicated': self.deduplicated,
+            'failed': self.failed,
+        }
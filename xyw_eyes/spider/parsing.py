@@ -0,0 +1,153 @@
+import re
+import threading
+from typing import Optional, Dict, Mapping
+
+from aiohttp import ClientResponse
+
+# 每个线程各自复用的lxml解析器，lxml的解析器不能在多个线程中同时使用
+_local = threading.local()
+# 在html开头查找meta中声明的编码
+_META_CHARSET = re.compile(br'<meta[^>]+charset\s*=\s*["\']?\s*([\w-]+)', re.I)
+# 只在开头的这些字节中查找meta
+_SNIFF_SIZE = 2048
+
+
+def get_parser(kind: str, encoding: Optional[str] = None):
+    """
+    获取当前线程中复用的lxml解析器
+    :param kind: 'html'或'xml'
+    :param encoding: 文档编码，为None时由lxml根据文档内容判断
+    :return:
+    """
+    from lxml import etree
+    parsers = getattr(_local, 'parsers', None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    key = (kind, encoding)
+    parser = parsers.get(key)
+    if parser is None:
+        if kind == 'html':
+            parser = etree.HTMLParser(encoding=encoding)
+        else:
+            # 不解析外部实体，也不访问网络
+            parser = etree.XMLParser(encoding=encoding, resolve_entities=False, no_network=True, huge_tree=True)
+        parsers[key] = parser
+    return parser
+
+
+def detect_encoding(response: ClientResponse, body: bytes, kind: str) -> Optional[str]:
+    """
+    确定文档编码：优先使用响应头中的charset
+    html没有charset时查找meta中声明的编码，仍然没有时使用utf-8，避免libxml2默认按ISO-8859-1解析
+    xml没有charset时由xml声明决定
+    :param response:
+    :param body:
+    :param kind:
+    :return:
+    """
+    charset = response.charset
+    if charset:
+        return charset.lower()
+    if kind == 'xml':
+        return None
+    if _META_CHARSET.search(body[:_SNIFF_SIZE]):
+        return None
+    return 'utf-8'
+
+
+def parse_bytes(body: bytes, kind: str = 'html', encoding: Optional[str] = None, base_url: Optional[str] = None):
+    """
+    直接从字节解析html或xml，不需要先解码为字符串
+    :param body:
+    :param kind: 'html'或'xml'
+    :param encoding:
+    :param base_url: 文档的链接，用于解析相对链接
+    :return: 根节点，内容为空时返回None
+    """
+    from lxml import etree
+    if not body:
+        return None
+    return etree.fromstring(body, get_parser(kind, encoding), base_url=base_url)
+
+
+async def read_body(response: ClientResponse) -> bytes:
+    """
+    获取响应内容的字节，下载时已经读取了全部数据，直接返回缓存的字节而不复制
+    新版本aiohttp在连接释放后调用read()会报错，因此与text()、json()一样优先使用缓存
+    :param response:
+    :return:
+    """
+    body = getattr(response, '_body', None)
+    if body is None:
+        body = await response.read()
+    return body
+
+
+class ResponseParser:
+    """
+    附加在response上的解析工具，同一个response的解析结果会被缓存
+    用法：tree = await response.html()、tree = await response.xml()、items = await response.feed(seen=guids)
+    """
+    __slots__ = ('response', '_trees')
+
+    def __init__(self, response: ClientResponse):
+        self.response = response
+        self._trees: Dict[str, object] = {}
+
+    async def _parse(self, kind: str):
+        if kind not in self._trees:
+            body = await read_body(self.response)
+            self._trees[kind] = parse_bytes(
+                body, kind, detect_encoding(self.response, body, kind), str(self.response.url)
+            )
+        return self._trees[kind]
+
+    async def html(self):
+        """
+        将响应内容解析为html
+        :return:
+        """
+        return await self._parse('html')
+
+    async def xml(self):
+        """
+        将响应内容解析为xml
+        :return:
+        """
+        return await self._parse('xml')
+
+    async def feed(self, **kwargs):
+        """
+        将响应内容作为RSS或Atom订阅源流式读取
+        :param kwargs: 传递给xyw_eyes.rss.reader.read_feed的参数，例如seen、limit
+        :return: 生成RSSItem的迭代器
+        """
+        from xyw_eyes.rss.reader import read_feed
+        kwargs.setdefault('source', self.response.url.host)
+        return read_feed(await read_body(self.response), **kwargs)
+
+    @classmethod
+    def attach(cls, response: ClientResponse) -> ClientResponse:
+        """
+        为response添加html()、xml()和feed()方法
+        :param response:
+        :return:
+        """
+        parser = cls(response)
+        response.html = parser.html
+        response.xml = parser.xml
+        response.feed = parser.feed
+        return response
+
+
+def compile_xpaths(xpaths: Mapping[str, str], namespaces: Optional[Mapping[str, str]] = None) -> dict:
+    """
+    预编译XPath表达式
+    :param xpaths: 名称到XPath字符串的映射
+    :param namespaces: XPath中使用的命名空间前缀
+    :return: 名称到etree.XPath对象的映射
+    """
+    if not xpaths:
+        return {}
+    from lxml import etree
+    return {name: etree.XPath(path, namespaces=namespaces) for name, path in xpaths.items()}
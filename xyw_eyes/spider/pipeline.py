@@ -0,0 +1,180 @@
+import time
+import asyncio
+from typing import Optional, Union, Callable, Awaitable, List, Dict
+
+from xyw_eyes.spider.item import Item
+
+
+class DropItem(Exception):
+    """
+    在处理阶段中抛出，丢弃当前item，不再运行之后的阶段，不计为失败
+    """
+
+
+class Stage:
+    """
+    item处理链中的一个阶段，可以分别限制同时处理的item数、失败后的重试次数以及超时时间
+    func为协程函数或爬虫的方法名，参数为item的数据，返回值不为None时替换item的数据，抛出DropItem时丢弃item
+    """
+
+    def __init__(self,
+                 func: Union[str, Callable[[dict], Awaitable]],
+                 name: Optional[str] = None,
+                 concurrency: int = 0,
+                 retry_times: int = 0,
+                 retry_delay: float = 0,
+                 timeout: float = 0):
+        """
+        :param func: 协程函数或爬虫的方法名
+        :param name: 日志中使用的名称，默认为函数名
+        :param concurrency: 同时处理的item数上限，为0时不限制
+        :param retry_times: 失败后在本阶段内重试的次数，重试仍然失败时item按处理失败重新入队，之后从本阶段继续
+        :param retry_delay: 第一次重试前的等待时间（秒），之后依次翻倍
+        :param timeout: 每次处理的超时时间（秒），从获得并发名额后开始计算，不包括等待名额的时间，为0时不限制
+        """
+        if not (isinstance(concurrency, int) and concurrency >= 0):
+            raise TypeError('concurrency must be integer no less than 0')
+        if not (isinstance(retry_times, int) and retry_times >= 0):
+            raise TypeError('retry_times must be integer no less than 0')
+        self.func = func
+        self.name = name if name is not None else (func if isinstance(func, str) else func.__name__)
+        self.concurrency = concurrency
+        self.retry_times = retry_times
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        # 信号量绑定到使用它的事件循环，每次运行都在新的事件循环中进行，因此在运行时按事件循环创建
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.timeouts = 0
+        # 处理耗时以及等待并发名额的时间（秒），不包括失败的尝试
+        self.elapsed = 0.0
+        self.max_elapsed = 0.0
+        self.waited = 0.0
+
+    def bind(self, obj, default_timeout: float = 0) -> 'Stage':
+        """
+        创建使用obj的同名方法的新阶段，统计数据和并发限制不与原阶段共用
+        :param obj: 爬虫实例
+        :param default_timeout: 本阶段没有设置timeout时使用的超时时间，例如爬虫的pipeline_timeout
+        :return:
+        """
+        func = getattr(obj, self.func) if isinstance(self.func, str) else self.func
+        if not callable(func):
+            raise TypeError('%s is not callable' % self.name)
+        return Stage(func, self.name, self.concurrency, self.retry_times, self.retry_delay,
+                     self.timeout or default_timeout)
+
+    def _get_semaphore(self) -> Optional[asyncio.Semaphore]:
+        if not self.concurrency:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def _call(self, data: dict):
+        begin = time.perf_counter()
+        semaphore = self._get_semaphore()
+        if semaphore is None:
+            waited = 0.0
+            result = await self._invoke(data)
+        else:
+            async with semaphore:
+                waited = time.perf_counter() - begin
+                result = await self._invoke(data)
+        elapsed = time.perf_counter() - begin - waited
+        self.elapsed += elapsed
+        self.max_elapsed = max(self.max_elapsed, elapsed)
+        self.waited += waited
+        return result
+
+    async def _invoke(self, data: dict):
+        # 在获得并发名额之后调用，超时时间不包括等待名额的时间
+        if not self.timeout:
+            return await self.func(data)
+        try:
+            return await asyncio.wait_for(self.func(data), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    async def run(self, data: dict, logger=None):
+        """
+        处理item的数据，失败时按retry_times重试
+        :param data:
+        :param logger:
+        :return: func的返回值
+        """
+        attempt = 0
+        while True:
+            try:
+                result = await self._call(data)
+            except DropItem:
+                self.dropped += 1
+                raise
+            except Exception:
+                if attempt >= self.retry_times:
+                    self.failed += 1
+                    raise
+                attempt += 1
+                self.retries += 1
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                if logger is not None:
+                    logger.warning('阶段 %s 第%d次处理item失败，%s秒后重试' % (self.name, attempt, delay), exc_info=True)
+                if delay:
+                    await asyncio.sleep(delay)
+                continue
+            self.processed += 1
+            return result
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'retries': self.retries,
+            'timeouts': self.timeouts,
+            'elapsed': self.elapsed,
+            'max_elapsed': self.max_elapsed,
+            'waited': self.waited,
+        }
+
+
+class ItemPipeline:
+    """
+    依次运行各处理阶段，不同item可以同时处于不同的阶段，每个阶段只受自身的并发限制
+    item.stage记录下一个要运行的阶段，处理失败重新入队的item从失败的阶段继续，之前的阶段不会重复运行
+    """
+
+    def __init__(self, stages: List[Stage], logger=None):
+        self.stages = stages
+        self.logger = logger
+
+    async def process(self, item: Item) -> bool:
+        """
+        从item.stage开始运行各阶段
+        :param item:
+        :return: item被丢弃时返回False
+        """
+        while item.stage < len(self.stages):
+            try:
+                result = await self.stages[item.stage].run(item.data, self.logger)
+            except DropItem:
+                item.stage = len(self.stages)
+                return False
+            if result is not None:
+                item.data = result
+            item.stage += 1
+        return True
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        各阶段的统计数据：处理成功、丢弃、失败的item数，重试次数，处理耗时及等待并发名额的时间
+        :return:
+        """
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,196 @@
+import os
+import json
+import math
+import time
+from typing import Optional, Dict, List, Iterable, Iterator, Set
+
+# 每个起始链接保存的最近出现过的item键的数量上限
+KEEP_KEYS = 200
+
+
+def item_keys(data) -> Iterator[str]:
+    """
+    查找item中的唯一标识：RSSItem的guid或link，字典中的guid或link字段，也会查找列表以及没有这两个字段的字典中的值
+    :param data:
+    :return:
+    """
+    from xyw_eyes.rss.rss import RSSItem, Guid
+    if isinstance(data, RSSItem):
+        guid = data.guid.guid if isinstance(data.guid, Guid) else data.guid
+        if guid or data.link:
+            yield str(guid or data.link)
+    elif isinstance(data, dict):
+        key = data.get('guid') or data.get('link')
+        if isinstance(key, Guid):
+            key = key.guid
+        if key:
+            yield str(key)
+        else:
+            for value in data.values():
+                yield from item_keys(value)
+    elif isinstance(data, (list, tuple)):
+        for value in data:
+            yield from item_keys(value)
+
+
+class SourceState:
+    """
+    一个起始链接的爬取历史
+    """
+    __slots__ = ('interval', 'next', 'fetches', 'changes', 'last_change', 'keys')
+
+    def __init__(self, interval: float, next: float = 0.0, fetches: int = 0, changes: int = 0,
+                 last_change: Optional[float] = None, keys: Optional[List[str]] = None):
+        # 当前的爬取间隔（秒）
+        self.interval = interval
+        # 下次到期的时间
+        self.next = next
+        # 爬取次数以及其中出现新item的次数
+        self.fetches = fetches
+        self.changes = changes
+        self.last_change = last_change
+        # 最近出现过的item键，按出现顺序排列
+        self.keys = keys if keys is not None else []
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class PollSchedule:
+    """
+    按起始链接记录每次爬取出现的新item数，自适应调整各起始链接的爬取间隔：
+    没有新item时间隔乘以backoff（指数退避），有新item时乘以speedup，始终限制在[min_interval, max_interval]之间
+    每次运行只爬取已经到期的起始链接，没有记录的起始链接总是到期
+    """
+
+    def __init__(self, path: str, min_interval: float = 600, max_interval: float = 24 * 3600,
+                 backoff: float = 2.0, speedup: float = 0.5):
+        """
+        :param path: 保存爬取历史的json文件路径
+        :param min_interval: 爬取间隔的下限（秒），新的起始链接也使用该间隔
+        :param max_interval: 爬取间隔的上限（秒）
+        :param backoff: 没有新item时爬取间隔的倍数，需要大于等于1
+        :param speedup: 有新item时爬取间隔的倍数，需要在(0, 1]之间
+        """
+        if not 0 < min_interval <= max_interval:
+            raise ValueError('min_interval must be greater than 0 and no greater than max_interval')
+        if backoff < 1:
+            raise ValueError('backoff must be no less than 1')
+        if not 0 < speedup <= 1:
+            raise ValueError('speedup must be in (0, 1]')
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.speedup = speedup
+        self.sources: Dict[str, SourceState] = {}
+        # 本次运行中成功下载过的起始链接，以及各起始链接新出现的item键
+        self._fetched: Set[str] = set()
+        self._new: Dict[str, Set[str]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return
+        for source, state in data.items():
+            self.sources[source] = SourceState(**state)
+
+    def save(self) -> None:
+        """
+        保存爬取历史
+        :return:
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        data = {source: state.to_dict() for source, state in self.sources.items()}
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as fp:
+            json.dump(data, fp, ensure_ascii=False)
+        os.replace(self.path + '.tmp', self.path)
+
+    def due(self, sources: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """
+        筛选已经到期的起始链接
+        :param sources:
+        :param now:
+        :return:
+        """
+        now = time.time() if now is None else now
+        return [source for source in sources if source not in self.sources or self.sources[source].next <= now]
+
+    def fetched(self, source: Optional[str]) -> None:
+        """
+        记录起始链接本次已经成功下载
+        :param source:
+        :return:
+        """
+        if source is not None:
+            self._fetched.add(source)
+
+    def observe(self, source: Optional[str], keys: Iterable[str]) -> int:
+        """
+        记录起始链接本次爬取到的item键
+        :param source:
+        :param keys:
+        :return: 其中新出现的键的数量
+        """
+        if source is None:
+            return 0
+        state = self.sources.get(source)
+        known = set(state.keys) if state is not None else set()
+        new = self._new.setdefault(source, set())
+        before = len(new)
+        new.update(key for key in keys if key is not None and key not in known)
+        return len(new) - before
+
+    def commit(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        根据本次运行的结果调整爬取间隔，没有成功下载的起始链接保持原来的间隔，下次运行时仍然到期
+        :param now: 本次运行的开始时间，以开始时间计算下次到期时间，避免定时运行时因爬取耗时而错过一个周期
+        :return: 本次成功下载的各起始链接新出现的item数
+        """
+        now = time.time() if now is None else now
+        result = {}
+        for source in self._fetched:
+            new = self._new.get(source, set())
+            state = self.sources.get(source)
+            if state is None:
+                # 第一次爬取到的item不算作更新
+                state = self.sources[source] = SourceState(self.min_interval)
+            elif new:
+                state.interval *= self.speedup
+                state.changes += 1
+                state.last_change = now
+            else:
+                state.interval *= self.backoff
+            state.interval = min(max(state.interval, self.min_interval), self.max_interval)
+            state.next = now + state.interval
+            state.fetches += 1
+            state.keys = (state.keys + sorted(new))[-KEEP_KEYS:]
+            result[source] = len(new)
+        self._fetched.clear()
+        self._new.clear()
+        return result
+
+    def ttl(self) -> int:
+        """
+        RSS2的ttl（分钟），为各起始链接中最短的爬取间隔，即RSS文件最早可能发生变化的时间
+        :return:
+        """
+        intervals = [state.interval for state in self.sources.values()]
+        return max(1, math.ceil((min(intervals) if intervals else self.min_interval) / 60))
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        各起始链接的统计数据
+        :return:
+        """
+        return {source: {
+            'interval': state.interval,
+            'next': state.next,
+            'fetches': state.fetches,
+            'changes': state.changes,
+            'last_change': state.last_change,
+        } for source, state in self.sources.items()}
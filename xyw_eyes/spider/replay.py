@@ -0,0 +1,205 @@
+import io
+import json
+import mmap
+import zlib
+import random
+import struct
+import asyncio
+from typing import Optional, Dict, List
+
+from aiohttp import ClientResponseError, RequestInfo
+from aiohttp.helpers import parse_mimetype
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from xyw_eyes.spider.request import Request
+from xyw_eyes.spider.backend import Downloader, AiohttpDownloader
+
+# 存档文件的开头，结尾为8字节的索引位置
+MAGIC = b'XYWREC1\n'
+_TRAILER = struct.Struct('<Q')
+# body已经解压，回放时不再需要这些响应头
+_DROP_HEADERS = ('Content-Encoding', 'Transfer-Encoding', 'Content-Length')
+
+
+class ReplayMiss(Exception):
+    """
+    存档中没有该request的记录
+    """
+
+
+class RecordingDownloader(Downloader):
+    """
+    记录经过的每个request及其响应（状态码、响应头、内容），保存为一个存档文件，供ReplayDownloader回放
+    存档由依次写入的响应内容和结尾的json索引组成，索引以request指纹为键
+    """
+
+    def __init__(self, path: str, downloader: Optional[Downloader] = None, compress: bool = False):
+        """
+        :param path: 存档文件路径，已存在时覆盖
+        :param downloader: 实际下载使用的后端，默认为AiohttpDownloader
+        :param compress: 是否使用zlib压缩响应内容，压缩后存档更小，回放时需要解压
+        """
+        self.path = path
+        self.downloader = downloader if downloader is not None else AiohttpDownloader()
+        self.compress = compress
+        self._file: Optional[io.BufferedWriter] = None
+        self._index: Dict[str, List[dict]] = {}
+
+    async def open(self, connector) -> None:
+        await self.downloader.open(connector)
+        self._file = open(self.path, 'wb')
+        self._file.write(MAGIC)
+        self._index = {}
+
+    async def fetch(self, request: Request):
+        resp = await self.downloader.fetch(request)
+        body = resp._body if getattr(resp, '_body', None) is not None else await resp.read()
+        data = zlib.compress(body) if self.compress else body
+        headers = [[key, value] for key, value in resp.headers.items() if key not in _DROP_HEADERS]
+        self._index.setdefault(request.fingerprint(), []).append({
+            'offset': self._file.tell(),
+            'length': len(data),
+            'zlib': self.compress,
+            'status': resp.status,
+            'reason': resp.reason,
+            'url': str(resp.url),
+            'headers': headers,
+        })
+        self._file.write(data)
+        return resp
+
+    async def close(self) -> None:
+        if self._file is not None:
+            offset = self._file.tell()
+            self._file.write(json.dumps(self._index, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            self._file.write(_TRAILER.pack(offset))
+            self._file.close()
+            self._file = None
+        await self.downloader.close()
+
+    def transfer_stats(self) -> Dict[str, Dict[str, int]]:
+        return self.downloader.transfer_stats()
+
+
+class ReplayResponse:
+    """
+    回放的响应，提供爬虫常用的ClientResponse接口
+    """
+
+    def __init__(self, method: str, entry: dict, body: bytes):
+        self.method = method
+        self.status: int = entry['status']
+        self.reason: Optional[str] = entry['reason']
+        self.url = URL(entry['url'])
+        self.headers = CIMultiDictProxy(CIMultiDict(entry['headers']))
+        self.history = ()
+        self._body = body
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    @property
+    def content_type(self) -> str:
+        mimetype = parse_mimetype(self.headers.get('Content-Type', 'application/octet-stream'))
+        return '%s/%s' % (mimetype.type, mimetype.subtype)
+
+    @property
+    def charset(self) -> Optional[str]:
+        return parse_mimetype(self.headers.get('Content-Type', '')).parameters.get('charset')
+
+    @property
+    def content_length(self) -> Optional[int]:
+        return len(self._body)
+
+    @property
+    def request_info(self) -> RequestInfo:
+        return RequestInfo(self.url, self.method, CIMultiDictProxy(CIMultiDict()), self.url)
+
+    def get_encoding(self) -> str:
+        return self.charset or 'utf-8'
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: Optional[str] = None, errors: str = 'strict') -> str:
+        return self._body.decode(encoding or self.get_encoding(), errors)
+
+    async def json(self, *, encoding: Optional[str] = None, loads=json.loads, content_type: Optional[str] = None):
+        return loads(self._body.decode(encoding or self.get_encoding()))
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise ClientResponseError(self.request_info, (), status=self.status, message=self.reason or '')
+
+    def release(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class ReplayDownloader(Downloader):
+    """
+    从RecordingDownloader的存档中回放响应，不访问网络
+    存档通过mmap映射，只有用到的响应才会被读入内存；同一request有多条记录时按记录顺序依次回放
+    """
+
+    def __init__(self, path: str, latency: float = 0.0, jitter: float = 0.0, seed: int = 0, strict: bool = True):
+        """
+        :param path: 存档文件路径
+        :param latency: 每个响应模拟的延迟（秒）
+        :param jitter: 在latency上增加的随机延迟的上限（秒），使用固定的随机种子，每次运行的延迟序列相同
+        :param seed: 随机种子
+        :param strict: 存档中没有记录时为True则抛出ReplayMiss，否则返回404响应
+        """
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.strict = strict
+        self._random = random.Random(seed)
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._index: Dict[str, List[dict]] = {}
+        self._cursor: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def open(self, connector) -> None:
+        self._file = open(self.path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError('not a recording archive: %s' % self.path)
+        offset, = _TRAILER.unpack(self._mmap[-_TRAILER.size:])
+        self._index = json.loads(self._mmap[offset:-_TRAILER.size].decode('utf-8'))
+        self._cursor = {}
+
+    async def fetch(self, request: Request) -> ReplayResponse:
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        fingerprint = request.fingerprint()
+        entries = self._index.get(fingerprint)
+        if not entries:
+            self.misses += 1
+            if self.strict:
+                raise ReplayMiss('no recording for %s %s' % (request.method, request.url))
+            return ReplayResponse(request.method, {
+                'status': 404, 'reason': 'Not Recorded', 'url': str(request.url), 'headers': []
+            }, b'')
+        position = self._cursor.get(fingerprint, 0)
+        self._cursor[fingerprint] = position + 1
+        entry = entries[position % len(entries)]
+        body = self._mmap[entry['offset']:entry['offset'] + entry['length']]
+        if entry['zlib']:
+            body = zlib.decompress(body)
+        self.hits += 1
+        return ReplayResponse(request.method, entry, body)
+
+    async def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+            self._file = None
@@ -1,15 +1,22 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields, MISSING
 from typing import Any, Optional, Union, Mapping, Iterable
 from types import MethodType
 import asyncio
+import sys
+import hashlib
+import json
+import pickle
 
 import aiohttp
 from aiohttp import BasicAuth, ClientTimeout, HttpVersion, http
 from aiohttp.typedefs import StrOrURL, LooseHeaders, LooseCookies
 from aiohttp.connector import BaseConnector
 
+# Python 3.10及以上使用__slots__，减少大量Request对象的内存占用
+_dataclass_options = {'slots': True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+
+@dataclass(**_dataclass_options)
 class Request:
     url: StrOrURL
     method: str = 'GET'
@@ -36,20 +43,105 @@ class Request:
 
     metadata: Any = None
     retry_times: int = 0
+    # 调度优先级，数值越大越先处理
+    priority: int = 0
+    # 爬取深度，起始请求为0，为None时入队时根据父请求自动设置
+    depth: Optional[int] = None
+    # 产生该请求的起始链接，起始请求为其自身的url，为None时入队时继承父请求的source
+    source: Optional[str] = None
+
+    def options(self) -> dict:
+        """
+        发送请求时传给aiohttp的参数，不包括method、url以及connector、loop、version这些会话级别的参数
+        :return:
+        """
+        # 直接列出各参数，不再每次遍历实例属性
+        return dict(
+            params=self.params,
+            data=self.data,
+            json=self.json,
+            headers=self.headers,
+            skip_auto_headers=self.skip_auto_headers,
+            auth=self.auth,
+            allow_redirects=self.allow_redirects,
+            max_redirects=self.max_redirects,
+            compress=self.compress,
+            chunked=self.chunked,
+            expect100=self.expect100,
+            raise_for_status=self.raise_for_status,
+            read_until_eof=self.read_until_eof,
+            proxy=self.proxy,
+            proxy_auth=self.proxy_auth,
+            timeout=self.timeout,
+            cookies=self.cookies
+        )
+
+    def request(self, connector: Optional[BaseConnector] = None):
+        """
+        发送请求
+        :param connector: 请求自身没有指定connector时使用的connector，用于在多个请求之间复用连接
+        :return:
+        """
+        return aiohttp.request(
+            self.method,
+            self.url,
+            version=self.version,
+            connector=self.connector if self.connector is not None else connector,
+            loop=self.loop,
+            **self.options()
+        )
 
-    def request(self):
-        dic = self.__dict__
-        sub_key = [
-            'url', 'method', 'params', 'data', 'json', 'headers', 'skip_auto_headers', 'auth',
-            'allow_redirects', 'max_redirects', 'compress', 'chunked', 'expect100', 'raise_for_status',
-            'read_until_eof', 'proxy', 'proxy_auth', 'timeout', 'cookies', 'version', 'connector', 'loop'
-        ]
-        sub_dic = {key: value for key, value in dic.items() if key in sub_key}
-        return aiohttp.request(**sub_dic)
+    def to_bytes(self) -> bytes:
+        """
+        紧凑的序列化结果，只包含与默认值不同的字段，用于写入磁盘
+        设置了connector或loop的request无法序列化
+        :return:
+        """
+        values = []
+        for index, (name, default) in enumerate(_field_defaults()):
+            value = getattr(self, name)
+            if value is not default and value != default:
+                values.append((index, value))
+        return pickle.dumps(values, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Request':
+        """
+        从to_bytes的结果中恢复request
+        :param data:
+        :return:
+        """
+        defaults = _field_defaults()
+        return cls(**{defaults[index][0]: value for index, value in pickle.loads(data)})
 
     def increase_retry_times(self):
         self.retry_times = self.retry_times + 1
 
+    def fingerprint(self) -> str:
+        """
+        请求指纹，请求方法、链接、查询参数以及请求体均相同的请求指纹相同，用于去重
+        :return:
+        """
+        params = sorted(self.params.items()) if isinstance(self.params, Mapping) else self.params
+        body = self.json if self.json is not None else self.data
+        if isinstance(body, Mapping):
+            body = sorted(body.items())
+        text = json.dumps([self.method.upper(), str(self.url), params, body], default=str, ensure_ascii=False)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+_defaults = []
+
+
+def _field_defaults() -> list:
+    """
+    Request各字段的名称及默认值，url没有默认值
+    :return:
+    """
+    if not _defaults:
+        _defaults.extend((field.name, None if field.default is MISSING else field.default) for field in fields(Request))
+    return _defaults
+
 
 if __name__ == '__main__':
     async def meta(self):
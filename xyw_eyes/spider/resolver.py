@@ -0,0 +1,66 @@
+import time
+import socket
+from typing import Dict, Tuple, List, Optional
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+try:
+    # 可选依赖，安装后按DNS记录自身的TTL缓存解析结果
+    import aiodns
+except ImportError:
+    aiodns = None
+
+# 进程级DNS缓存，同一进程中多次运行爬虫时共用，键为(域名, 端口, 地址族)，值为(过期时间, 解析结果)
+_cache: Dict[Tuple[str, int, int], Tuple[float, List[dict]]] = {}
+
+
+class CachingResolver(AbstractResolver):
+    """
+    带缓存的DNS解析器，解析结果在进程内跨多次运行共享
+    安装aiodns时按DNS记录的TTL确定缓存时间，否则使用固定的ttl
+    """
+
+    def __init__(self, ttl: float = 300, resolver: Optional[AbstractResolver] = None):
+        """
+        :param ttl: 无法获取DNS记录TTL时的缓存时间，单位秒
+        :param resolver: 实际进行解析的解析器，默认为aiohttp的DefaultResolver
+        """
+        self.ttl = ttl
+        self._resolver = resolver if resolver is not None else DefaultResolver()
+        self._dns = aiodns.DNSResolver() if aiodns is not None else None
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> List[dict]:
+        key = (host, port, family)
+        cached = _cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return list(cached[1])
+        hosts = await self._resolver.resolve(host, port, family)
+        _cache[key] = (time.monotonic() + await self._record_ttl(host, family), list(hosts))
+        return hosts
+
+    async def _record_ttl(self, host: str, family: int) -> float:
+        """
+        查询DNS记录的TTL，查询失败时返回默认的ttl
+        :param host:
+        :param family:
+        :return:
+        """
+        if self._dns is None:
+            return self.ttl
+        try:
+            records = await self._dns.query(host, 'AAAA' if family == socket.AF_INET6 else 'A')
+            return min(record.ttl for record in records)
+        except Exception:
+            return self.ttl
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+    @staticmethod
+    def clear_cache() -> None:
+        """
+        清空进程级DNS缓存
+        :return:
+        """
+        _cache.clear()
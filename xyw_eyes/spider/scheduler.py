@@ -0,0 +1,48 @@
+from contextvars import ContextVar
+from typing import Optional
+
+from xyw_eyes.spider.request import Request
+from xyw_eyes.spider.spill import SpillingQueue
+
+# 当前正在处理的response对应的request，用于给parse中新产生的request自动设置深度
+current_request: ContextVar[Optional[Request]] = ContextVar('current_request', default=None)
+
+# 支持的调度顺序
+SCHEDULE_ORDERS = ('fifo', 'dfs', 'bfs')
+
+
+class RequestQueue(SpillingQueue):
+    """
+    按优先级调度的request队列，priority较大的request先出队
+    priority相同时，fifo按入队顺序，dfs优先处理深度较大的request，bfs优先处理深度较小的request
+    深度未设置的request入队时自动设置为父request的深度加一，没有父request时为0，source未设置时继承父request的source
+    设置memory_limit时超出的request只保存非默认值的字段，写入磁盘
+    """
+
+    def __init__(self, maxsize: int = 0, order: str = 'fifo', memory_limit: int = 0, spill_dir: Optional[str] = None):
+        if order not in SCHEDULE_ORDERS:
+            raise ValueError('order must be one of %s' % ', '.join(SCHEDULE_ORDERS))
+        self.order = order
+        super().__init__(maxsize, memory_limit=memory_limit, spill_dir=spill_dir,
+                         encode=Request.to_bytes, decode=Request.from_bytes)
+
+    def _put(self, request: Request):
+        if request.depth is None:
+            parent = current_request.get()
+            request.depth = 0 if parent is None or parent.depth is None else parent.depth + 1
+        if request.source is None:
+            parent = current_request.get()
+            request.source = parent.source if parent is not None else None
+        super()._put(request)
+
+    def sort_key(self, request: Request) -> tuple:
+        """
+        计算request的排序键，值越小越先出队
+        :param request:
+        :return:
+        """
+        if self.order == 'dfs':
+            return -request.priority, -request.depth
+        if self.order == 'bfs':
+            return -request.priority, request.depth
+        return -request.priority,
@@ -0,0 +1,242 @@
+import os
+import heapq
+import struct
+import asyncio
+import itertools
+import threading
+import tempfile
+from collections import deque
+from typing import Optional, Dict, List, Callable, Any, Tuple, Deque
+
+# 每条记录的开头为4字节的长度以及8字节的入队序号
+_HEADER = struct.Struct('<IQ')
+
+
+class Segment:
+    """
+    追加写入的磁盘分段，同一分段中的记录按写入顺序读出，全部读出后删除文件
+    预读的记录缓存在内存中，可以在线程池中预读，避免在事件循环中读取磁盘
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writer = None
+        self._reader = None
+        # 已预读但还没有取出的记录
+        self._buffer: Deque[Tuple[int, bytes]] = deque()
+        self._lock = threading.Lock()
+        self.written = 0
+        self.taken = 0
+        self._read = 0
+
+    def __len__(self) -> int:
+        return self.written - self.taken
+
+    def append(self, counter: int, record: bytes) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = open(self.path, 'ab')
+            self._writer.write(_HEADER.pack(len(record), counter))
+            self._writer.write(record)
+            self.written += 1
+
+    def _fill(self, n: int) -> None:
+        # 调用时需要持有锁
+        n = min(n, self.written - self._read)
+        if n <= 0:
+            return
+        self._writer.flush()
+        if self._reader is None:
+            self._reader = open(self.path, 'rb')
+        for _ in range(n):
+            length, counter = _HEADER.unpack(self._reader.read(_HEADER.size))
+            self._buffer.append((counter, self._reader.read(length)))
+        self._read += n
+
+    def prefetch(self, n: int) -> None:
+        """
+        预读n条记录到内存中，可以在线程池中调用
+        :param n:
+        :return:
+        """
+        with self._lock:
+            self._fill(n - len(self._buffer))
+
+    def take(self, n: int) -> List[Tuple[int, bytes]]:
+        """
+        按写入顺序取出最多n条记录，全部取出后删除文件
+        :param n:
+        :return: (入队序号, 记录)组成的列表
+        """
+        with self._lock:
+            self._fill(n - len(self._buffer))
+            records = [self._buffer.popleft() for _ in range(min(n, len(self._buffer)))]
+            self.taken += len(records)
+            if self.taken == self.written:
+                self._reset()
+            return records
+
+    def _reset(self) -> None:
+        for fp in (self._writer, self._reader):
+            if fp is not None:
+                fp.close()
+        self._writer = self._reader = None
+        self._buffer.clear()
+        self.written = self.taken = self._read = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._reset()
+
+
+class SpillingQueue(asyncio.Queue):
+    """
+    内存中最多保留memory_limit个元素的队列，超出的元素序列化后写入磁盘分段，按sort_key和入队顺序出队
+    排序键相同的元素按入队顺序写入同一个分段，内存中的元素总是比磁盘中排序键相同的元素先入队，
+    因此只需比较内存中最小的排序键和磁盘中最小的排序键即可保证出队顺序与全部保留在内存中时相同
+    内存中的元素少于一半时在线程池中预读磁盘中的下一批元素
+    主线程和协程子线程都会向队列中放入元素，计数以及内存、磁盘中元素的增减都在锁中进行
+    """
+
+    def __init__(self, maxsize: int = 0, memory_limit: int = 0, spill_dir: Optional[str] = None,
+                 encode: Optional[Callable[[Any], bytes]] = None, decode: Optional[Callable[[bytes], Any]] = None,
+                 batch: int = 1000):
+        """
+        :param maxsize:
+        :param memory_limit: 内存中保留的元素数上限，为0时不写入磁盘
+        :param spill_dir: 磁盘分段所在目录的上级目录，为None时使用系统临时目录
+        :param encode: 序列化元素的函数，无法序列化（抛出异常）的元素保留在内存中
+        :param decode: 反序列化元素的函数
+        :param batch: 每次从磁盘读回内存的元素数
+        """
+        if memory_limit and (encode is None or decode is None):
+            raise ValueError('encode and decode are required when memory_limit is set')
+        self.memory_limit = memory_limit
+        self.spill_dir = spill_dir
+        self.encode = encode
+        self.decode = decode
+        self.batch = max(1, min(batch, memory_limit // 2 or batch))
+        self._counter = itertools.count()
+        self._segments: Dict[tuple, Segment] = {}
+        self._spilled = 0
+        self._directory: Optional[tempfile.TemporaryDirectory] = None
+        self._prefetching: Optional[asyncio.Future] = None
+        self._mutex = threading.Lock()
+        # 写入过磁盘的元素数，用于统计
+        self.spilled_total = 0
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self._queue = []
+
+    def sort_key(self, item) -> tuple:
+        """
+        计算元素的排序键，值越小越先出队，默认按入队顺序
+        :param item:
+        :return:
+        """
+        return ()
+
+    def qsize(self) -> int:
+        with self._mutex:
+            return len(self._queue) + self._spilled
+
+    def empty(self) -> bool:
+        with self._mutex:
+            return not self._queue and not self._spilled
+
+    def _segment(self, key: tuple) -> Segment:
+        segment = self._segments.get(key)
+        if segment is None:
+            if self._directory is None:
+                # 对象被回收或进程退出时自动删除
+                self._directory = tempfile.TemporaryDirectory(prefix='xyw-spill-', dir=self.spill_dir)
+            segment = Segment(os.path.join(self._directory.name, '%d.seg' % len(self._segments)))
+            self._segments[key] = segment
+        return segment
+
+    def _put(self, item):
+        key = self.sort_key(item)
+        with self._mutex:
+            self._push(key, next(self._counter), item)
+
+    def _push(self, key: tuple, counter: int, item) -> None:
+        # 调用时需要持有锁
+        if self.memory_limit:
+            segment = self._segments.get(key)
+            if len(self._queue) >= self.memory_limit or (segment is not None and len(segment)):
+                try:
+                    record = self.encode(item)
+                except Exception:
+                    record = None
+                if record is not None:
+                    self._segment(key).append(counter, record)
+                    self._spilled += 1
+                    self.spilled_total += 1
+                    return
+        heapq.heappush(self._queue, (key, counter, item))
+
+    def _min_spilled(self) -> Optional[tuple]:
+        keys = [key for key, segment in self._segments.items() if len(segment)]
+        return min(keys) if keys else None
+
+    def _refill(self) -> None:
+        """
+        保证出队顺序正确：磁盘中最小的排序键小于内存中最小的排序键时，先将该分段的下一批元素读回内存
+        调用时需要持有锁
+        :return:
+        """
+        if not self._spilled:
+            return
+        while True:
+            key = self._min_spilled()
+            if key is None or (self._queue and self._queue[0][0] <= key):
+                break
+            for counter, record in self._segments[key].take(self.batch):
+                heapq.heappush(self._queue, (key, counter, self.decode(record)))
+                self._spilled -= 1
+        if len(self._queue) < self.memory_limit // 2:
+            self._prefetch()
+
+    def _prefetch(self) -> None:
+        if self._prefetching is not None and not self._prefetching.done():
+            return
+        key = self._min_spilled()
+        if key is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._prefetching = loop.run_in_executor(None, self._segments[key].prefetch, self.batch)
+
+    def _get(self):
+        with self._mutex:
+            self._refill()
+            return heapq.heappop(self._queue)[-1]
+
+    def peek(self):
+        """
+        查看下一个出队的元素，但不将其取出
+        :return:
+        """
+        with self._mutex:
+            self._refill()
+            return self._queue[0][-1] if self._queue else None
+
+    def close(self) -> None:
+        """
+        删除磁盘分段，磁盘中的元素全部丢弃，之后仍然可以继续使用
+        :return:
+        """
+        with self._mutex:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments.clear()
+            self._spilled = 0
+            self.spilled_total = 0
+            if self._directory is not None:
+                self._directory.cleanup()
+                self._directory = None